@@ -7,7 +7,11 @@ load_dotenv()
 # Blockchain Configuration
 NETWORK = os.getenv("NETWORK", "ethereum")  # ethereum, polygon, etc.
 PROVIDER_URL = os.getenv("PROVIDER_URL", "https://mainnet.infura.io/v3/your-infura-key")
+# Comma-separated fallback providers, used round-robin (defaults to PROVIDER_URL only)
+PROVIDER_URLS = [url.strip() for url in os.getenv("PROVIDER_URLS", PROVIDER_URL).split(",") if url.strip()]
 CHAIN_ID = int(os.getenv("CHAIN_ID", "1"))  # 1 for Ethereum mainnet
+RPC_HTTP2 = os.getenv("RPC_HTTP2", "false").lower() == "true"  # Send RPCs over HTTP/2 with httpx
+WS_PROVIDER_URL = os.getenv("WS_PROVIDER_URL", "")  # WebSocket endpoint for price feed subscriptions
 
 # Wallet Configuration
 WALLET_ADDRESS = os.getenv("WALLET_ADDRESS", "")
@@ -1,6 +1,20 @@
+import asyncio
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from eth_abi import decode, encode
 from web3 import Web3
-from utils.web3_utils import get_web3_connection, sign_and_send_transaction, get_nonce
+from web3.exceptions import TransactionNotFound
+from utils.web3_utils import (
+    get_web3_connection,
+    get_async_web3_connection,
+    checksum,
+    get_nonce,
+    reset_nonce,
+    sign_and_send_transaction
+)
+from utils.retry import retryable
 from config.config import (
     AAVE_LENDING_POOL_ADDRESS,
     AAVE_DATA_PROVIDER_ADDRESS,
@@ -13,32 +27,140 @@ from config.config import (
 LENDING_POOL_ABI = []  # Replace with actual ABI
 DATA_PROVIDER_ABI = []  # Replace with actual ABI
 
+# Aave reports ETH amounts and the health factor in wei (18 decimals) and
+# the liquidation threshold and LTV in basis points
+WAD = 10**18
+BPS = 10000
+
+# HEALTH_FACTOR_MIN scaled to wei, so the safety check is a plain integer compare
+HEALTH_FACTOR_MIN_WAD = int(Decimal(str(HEALTH_FACTOR_MIN)) * WAD)
+
+# Selector of getUserAccountData(address), computed once instead of per call
+USER_ACCOUNT_DATA_SELECTOR = Web3.keccak(text="getUserAccountData(address)")[:4]
+
+# Output types of getUserAccountData(), used to decode raw eth_call return data
+USER_ACCOUNT_DATA_TYPES = ['uint256'] * 6
+
 class AaveManager:
     """
     Class to interact with Aave protocol for lending and borrowing operations.
     """
     
-    def __init__(self):
+    def __init__(self, cache_ttl=1.0, gas_price_ttl=15.0):
+        """
+        Initialize the Aave manager.
+        
+        Args:
+            cache_ttl (float, optional): Number of seconds for which user
+                account data is reused before being fetched again. Defaults to 1.0.
+            gas_price_ttl (float, optional): Number of seconds for which the
+                gas price is reused before being fetched again. Defaults to 15.0.
+        """
         self.web3 = get_web3_connection()
         self.lending_pool = self.web3.eth.contract(
-            address=self.web3.to_checksum_address(AAVE_LENDING_POOL_ADDRESS),
+            address=checksum(AAVE_LENDING_POOL_ADDRESS),
             abi=LENDING_POOL_ABI
         )
         self.data_provider = self.web3.eth.contract(
-            address=self.web3.to_checksum_address(AAVE_DATA_PROVIDER_ADDRESS),
+            address=checksum(AAVE_DATA_PROVIDER_ADDRESS),
             abi=DATA_PROVIDER_ABI
         )
-        self.wallet_address = self.web3.to_checksum_address(WALLET_ADDRESS)
+        self.wallet_address = checksum(WALLET_ADDRESS)
+        self.cache_ttl = cache_ttl
+        self._user_data_cache = None
+        self.gas_price_ttl = gas_price_ttl
+        self._gas_price_cache = None
+        
+        # The wallet never changes, so the getUserAccountData() calldata is encoded once
+        self.user_account_data_call = (
+            self.lending_pool.address,
+            Web3.to_hex(USER_ACCOUNT_DATA_SELECTOR + encode(['address'], [self.wallet_address]))
+        )
+        
+        # The async connection is created on first use
+        self.async_web3 = None
     
+    @retryable()
     def get_user_account_data(self):
         """
         Get user account data from Aave.
         
+        Results are cached for cache_ttl seconds so repeated calls within the
+        same monitoring tick do not issue duplicate RPCs. The call is retried
+        on transient provider errors.
+        
+        Returns:
+            dict: User account data including health factor, collateral, debt, etc.
+        """
+        if self._user_data_cache is not None:
+            cached_at, cached_data = self._user_data_cache
+            if time.monotonic() - cached_at < self.cache_ttl:
+                return cached_data
+        
+        address, calldata = self.user_account_data_call
+        return_data = self.web3.eth.call({'to': address, 'data': calldata})
+        user_data = self.decode_user_account_data(return_data)
+        
+        self._user_data_cache = (time.monotonic(), user_data)
+        return user_data
+    
+    @retryable()
+    async def get_user_account_data_async(self):
+        """
+        Get user account data from Aave without blocking the event loop.
+        
+        Shares the cache used by get_user_account_data, and is retried on
+        transient provider errors in the same way.
+        
+        Returns:
+            dict: User account data including health factor, collateral, debt, etc.
+        """
+        if self._user_data_cache is not None:
+            cached_at, cached_data = self._user_data_cache
+            if time.monotonic() - cached_at < self.cache_ttl:
+                return cached_data
+        
+        if self.async_web3 is None:
+            self.async_web3 = get_async_web3_connection()
+        
+        address, calldata = self.user_account_data_call
+        return_data = await self.async_web3.eth.call({'to': address, 'data': calldata})
+        user_data = self.decode_user_account_data(return_data)
+        
+        self._user_data_cache = (time.monotonic(), user_data)
+        return user_data
+    
+    def invalidate(self):
+        """
+        Clear the cached user account data.
+        
+        Called after every transaction, since it changes the account state.
+        """
+        self._user_data_cache = None
+    
+    def decode_user_account_data(self, return_data):
+        """
+        Decode the raw return data of a getUserAccountData() call.
+        
+        Args:
+            return_data (bytes): The ABI-encoded return data.
+            
         Returns:
             dict: User account data including health factor, collateral, debt, etc.
         """
-        user_data = self.lending_pool.functions.getUserAccountData(self.wallet_address).call()
+        user_data = decode(USER_ACCOUNT_DATA_TYPES, return_data)
+        return self._format_user_account_data(user_data)
+    
+    def _format_user_account_data(self, user_data):
+        """
+        Map the raw getUserAccountData() values to named fields.
         
+        Args:
+            user_data (list): The raw values returned by the lending pool.
+            
+        Returns:
+            dict: User account data including health factor, collateral, debt, etc.
+        """
         return {
             'total_collateral_eth': user_data[0],
             'total_debt_eth': user_data[1],
@@ -48,26 +170,37 @@ class AaveManager:
             'health_factor': user_data[5]
         }
     
-    def get_health_factor(self):
+    def get_health_factor(self, user_data=None):
         """
         Get the current health factor.
         
+        Args:
+            user_data (dict, optional): Previously fetched user account data.
+                If not provided, it is fetched from Aave.
+        
         Returns:
             float: The current health factor.
         """
-        user_data = self.get_user_account_data()
-        health_factor = user_data['health_factor'] / 1e18  # Convert from Wei
+        if user_data is None:
+            user_data = self.get_user_account_data()
+        # Integer true division is correctly rounded, unlike converting to float first
+        health_factor = user_data['health_factor'] / WAD  # Convert from Wei
         return health_factor
     
-    def is_position_safe(self):
+    def is_position_safe(self, user_data=None):
         """
         Check if the position is safe from liquidation.
         
+        Args:
+            user_data (dict, optional): Previously fetched user account data.
+                If not provided, it is fetched from Aave.
+        
         Returns:
             bool: True if the position is safe, False otherwise.
         """
-        health_factor = self.get_health_factor()
-        return health_factor > HEALTH_FACTOR_MIN
+        if user_data is None:
+            user_data = self.get_user_account_data()
+        return user_data['health_factor'] > HEALTH_FACTOR_MIN_WAD
     
     def deposit(self, asset_address, amount, referral_code=0):
         """
@@ -81,59 +214,197 @@ class AaveManager:
         Returns:
             str: The transaction hash.
         """
-        asset_address = self.web3.to_checksum_address(asset_address)
+        # Prepare the deposit transaction
+        tx = self._build_transaction(self._deposit_function(asset_address, amount, referral_code))
+        
+        # Sign and send the transaction
+        return self._send_transaction(tx)
+    
+    def withdraw(self, asset_address, amount):
+        """
+        Withdraw assets from Aave.
+        
+        Args:
+            asset_address (str): The address of the asset to withdraw.
+            amount (int): The amount to withdraw in Wei.
+            
+        Returns:
+            str: The transaction hash.
+        """
+        # Prepare the withdraw transaction
+        tx = self._build_transaction(self._withdraw_function(asset_address, amount))
+        
+        # Sign and send the transaction
+        return self._send_transaction(tx)
+    
+    def borrow(self, asset_address, amount, interest_rate_mode, referral_code=0):
+        """
+        Borrow assets from Aave.
+        
+        Args:
+            asset_address (str): The address of the asset to borrow.
+            amount (int): The amount to borrow in Wei.
+            interest_rate_mode (int): 1 for stable, 2 for variable.
+            referral_code (int, optional): Referral code. Defaults to 0.
+            
+        Returns:
+            str: The transaction hash.
+        """
+        # Prepare the borrow transaction
+        tx = self._build_transaction(self._borrow_function(asset_address, amount, interest_rate_mode, referral_code))
+        
+        # Sign and send the transaction
+        return self._send_transaction(tx)
+    
+    def repay(self, asset_address, amount, interest_rate_mode):
+        """
+        Repay borrowed assets to Aave.
+        
+        Args:
+            asset_address (str): The address of the asset to repay.
+            amount (int): The amount to repay in Wei.
+            interest_rate_mode (int): 1 for stable, 2 for variable.
+            
+        Returns:
+            str: The transaction hash.
+        """
+        # Prepare the repay transaction
+        tx = self._build_transaction(self._repay_function(asset_address, amount, interest_rate_mode))
+        
+        # Sign and send the transaction
+        return self._send_transaction(tx)
+    
+    def submit_many(self, actions):
+        """
+        Build, sign and broadcast several transactions without waiting for them to be mined.
+        
+        Sequential nonces are reserved up front, so the transactions can be
+        signed and sent concurrently. Use wait_for_receipts to confirm them.
+        
+        Args:
+            actions (list): (action, args) tuples, where action is one of
+                'deposit', 'withdraw', 'borrow' or 'repay' and args are the
+                positional arguments of the corresponding method.
+            
+        Returns:
+            list: The transaction hashes, in the same order as actions.
+            
+        Raises:
+            ValueError: If an action is not supported.
+        """
+        prepare = {
+            'deposit': self._deposit_function,
+            'withdraw': self._withdraw_function,
+            'borrow': self._borrow_function,
+            'repay': self._repay_function
+        }
+        
+        for action, _ in actions:
+            if action not in prepare:
+                raise ValueError(f"Unknown action: {action}")
+        
+        if not actions:
+            return []
+        
+        try:
+            # Each transaction reserves the next nonce as it is built
+            txs = [self._build_transaction(prepare[action](*args)) for action, args in actions]
+            
+            # Sent through the same helper as single transactions, so each one
+            # is retried and broadcast to every configured provider
+            with ThreadPoolExecutor(max_workers=len(txs)) as executor:
+                tx_hashes = list(executor.map(sign_and_send_transaction, txs))
+        except Exception:
+            # Some of the reserved nonces may not have been used
+            reset_nonce()
+            raise
+        finally:
+            self.invalidate()
+        
+        return tx_hashes
+    
+    async def wait_for_receipts(self, tx_hashes, timeout=120):
+        """
+        Wait for several transactions to be mined concurrently.
+        
+        Args:
+            tx_hashes (list): The transaction hashes.
+            timeout (float, optional): Seconds to wait for each transaction. Defaults to 120.
+            
+        Returns:
+            list: The transaction receipts, in the same order as tx_hashes.
+        """
+        web3 = get_async_web3_connection()
+        
+        return await asyncio.gather(*(
+            web3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+            for tx_hash in tx_hashes
+        ))
+    
+    def is_transaction_mined(self, tx_hash):
+        """
+        Check whether a transaction has been mined, without waiting for it.
+        
+        Args:
+            tx_hash (str): The transaction hash.
+            
+        Returns:
+            bool: True if the transaction has a receipt, False if it is still pending.
+        """
+        try:
+            self.web3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return False
+        
+        return True
+    
+    def _deposit_function(self, asset_address, amount, referral_code=0):
+        """
+        Prepare the lending pool deposit() call.
+        
+        Args:
+            asset_address (str): The address of the asset to deposit.
+            amount (int): The amount to deposit in Wei.
+            referral_code (int, optional): Referral code. Defaults to 0.
+            
+        Returns:
+            The prepared contract function call.
+        """
+        asset_address = checksum(asset_address)
         
         # Approve the lending pool to spend tokens
         # This would require the ERC20 ABI and approval transaction
         # For simplicity, we're skipping this step
         
-        # Prepare the deposit transaction
-        tx = self.lending_pool.functions.deposit(
+        return self.lending_pool.functions.deposit(
             asset_address,
             amount,
             self.wallet_address,
             referral_code
-        ).build_transaction({
-            'from': self.wallet_address,
-            'gas': 500000,
-            'gasPrice': self.web3.eth.gas_price,
-            'nonce': get_nonce()
-        })
-        
-        # Sign and send the transaction
-        return sign_and_send_transaction(tx)
+        )
     
-    def withdraw(self, asset_address, amount):
+    def _withdraw_function(self, asset_address, amount):
         """
-        Withdraw assets from Aave.
+        Prepare the lending pool withdraw() call.
         
         Args:
             asset_address (str): The address of the asset to withdraw.
             amount (int): The amount to withdraw in Wei.
             
         Returns:
-            str: The transaction hash.
+            The prepared contract function call.
         """
-        asset_address = self.web3.to_checksum_address(asset_address)
+        asset_address = checksum(asset_address)
         
-        # Prepare the withdraw transaction
-        tx = self.lending_pool.functions.withdraw(
+        return self.lending_pool.functions.withdraw(
             asset_address,
             amount,
             self.wallet_address
-        ).build_transaction({
-            'from': self.wallet_address,
-            'gas': 500000,
-            'gasPrice': self.web3.eth.gas_price,
-            'nonce': get_nonce()
-        })
-        
-        # Sign and send the transaction
-        return sign_and_send_transaction(tx)
+        )
     
-    def borrow(self, asset_address, amount, interest_rate_mode, referral_code=0):
+    def _borrow_function(self, asset_address, amount, interest_rate_mode, referral_code=0):
         """
-        Borrow assets from Aave.
+        Prepare the lending pool borrow() call.
         
         Args:
             asset_address (str): The address of the asset to borrow.
@@ -142,30 +413,21 @@ class AaveManager:
             referral_code (int, optional): Referral code. Defaults to 0.
             
         Returns:
-            str: The transaction hash.
+            The prepared contract function call.
         """
-        asset_address = self.web3.to_checksum_address(asset_address)
+        asset_address = checksum(asset_address)
         
-        # Prepare the borrow transaction
-        tx = self.lending_pool.functions.borrow(
+        return self.lending_pool.functions.borrow(
             asset_address,
             amount,
             interest_rate_mode,
             referral_code,
             self.wallet_address
-        ).build_transaction({
-            'from': self.wallet_address,
-            'gas': 500000,
-            'gasPrice': self.web3.eth.gas_price,
-            'nonce': get_nonce()
-        })
-        
-        # Sign and send the transaction
-        return sign_and_send_transaction(tx)
+        )
     
-    def repay(self, asset_address, amount, interest_rate_mode):
+    def _repay_function(self, asset_address, amount, interest_rate_mode):
         """
-        Repay borrowed assets to Aave.
+        Prepare the lending pool repay() call.
         
         Args:
             asset_address (str): The address of the asset to repay.
@@ -173,26 +435,75 @@ class AaveManager:
             interest_rate_mode (int): 1 for stable, 2 for variable.
             
         Returns:
-            str: The transaction hash.
+            The prepared contract function call.
         """
-        asset_address = self.web3.to_checksum_address(asset_address)
+        asset_address = checksum(asset_address)
         
         # Approve the lending pool to spend tokens
         # This would require the ERC20 ABI and approval transaction
         # For simplicity, we're skipping this step
         
-        # Prepare the repay transaction
-        tx = self.lending_pool.functions.repay(
+        return self.lending_pool.functions.repay(
             asset_address,
             amount,
             interest_rate_mode,
             self.wallet_address
-        ).build_transaction({
-            'from': self.wallet_address,
-            'gas': 500000,
-            'gasPrice': self.web3.eth.gas_price,
-            'nonce': get_nonce()
-        })
+        )
+    
+    def _cached_gas_price(self):
+        """
+        Get the gas price, reusing the last value for gas_price_ttl seconds.
         
-        # Sign and send the transaction
-        return sign_and_send_transaction(tx)
+        Returns:
+            int: The gas price in Wei.
+        """
+        if self._gas_price_cache is not None:
+            cached_at, gas_price = self._gas_price_cache
+            if time.monotonic() - cached_at < self.gas_price_ttl:
+                return gas_price
+        
+        gas_price = self.web3.eth.gas_price
+        self._gas_price_cache = (time.monotonic(), gas_price)
+        return gas_price
+    
+    def _build_transaction(self, contract_function):
+        """
+        Build a transaction for a lending pool function call.
+        
+        Args:
+            contract_function: The prepared contract function call.
+            
+        Returns:
+            dict: The transaction.
+        """
+        try:
+            return contract_function.build_transaction({
+                'from': self.wallet_address,
+                'gas': 500000,
+                'gasPrice': self._cached_gas_price(),
+                'nonce': get_nonce()
+            })
+        except Exception:
+            # The reserved nonce was never used
+            reset_nonce()
+            raise
+    
+    def _send_transaction(self, tx):
+        """
+        Sign and send a transaction and invalidate the cached account data.
+        
+        Args:
+            tx (dict): The transaction to sign and send.
+            
+        Returns:
+            str: The transaction hash.
+        """
+        try:
+            return sign_and_send_transaction(tx)
+        except Exception:
+            # The transaction may not have been broadcast, so the local
+            # nonce can no longer be trusted
+            reset_nonce()
+            raise
+        finally:
+            self.invalidate()
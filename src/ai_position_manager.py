@@ -1,8 +1,13 @@
-import json
+import asyncio
 import time
-import openai
+from collections import OrderedDict
+from openai import OpenAI
+import orjson
 import pandas as pd
 import numpy as np
+from utils.ring_buffer import RingBuffer
+from utils.multicall import aggregate3
+from src.aave_manager import WAD, BPS
 from config.config import (
     OPENAI_API_KEY, 
     AI_MODEL, 
@@ -10,8 +15,68 @@ from config.config import (
     HEALTH_FACTOR_MIN
 )
 
-# Set OpenAI API key
-openai.api_key = OPENAI_API_KEY
+# Position fields sent to the AI model, in the order described in SYSTEM_PROMPT
+PROMPT_POSITION_FIELDS = (
+    'total_collateral_eth',
+    'total_debt_eth',
+    'available_borrow_eth',
+    'current_liquidation_threshold',
+    'ltv',
+    'health_factor'
+)
+
+# Everything that does not change between calls lives in the system prompt, so
+# the user message only carries the current data as compact JSON
+SYSTEM_PROMPT = (
+    "You are an AI financial advisor specialized in DeFi position management. "
+    "Your task is to analyze the provided market and position data and recommend actions to prevent liquidation.\n"
+    "Each message is a JSON object with these keys:\n"
+    "- pos: [" + ", ".join(PROMPT_POSITION_FIELDS) + "] (amounts in ETH, threshold and LTV as fractions)\n"
+    "- px: current price per pair\n"
+    "- dpx: price change since the previous check, in percent, per pair\n"
+    "- vol: volatility (coefficient of variation of recent prices), in percent, per pair\n"
+    f"Parameters: liquidation threshold buffer {LIQUIDATION_THRESHOLD_BUFFER}, minimum health factor {HEALTH_FACTOR_MIN}.\n"
+    "Recommend one action: add_collateral, repay_debt, withdraw_collateral, borrow_more or none, "
+    "with the amount and asset where applicable, the reason and your confidence (0-100).\n"
+    'Respond with a JSON object only: {"action": "add_collateral|repay_debt|withdraw_collateral|borrow_more|none", '
+    '"asset": "ETH|USDC|...", "amount": 0.0, "reason": "Your reasoning here", "confidence": 85}'
+)
+
+# Fixed sampling seed, so identical prompts get the same recommendation
+COMPLETION_SEED = 1234
+
+# Models that support response_format={"type": "json_object"}
+JSON_MODE_MODELS = ('gpt-4-turbo', 'gpt-4-1106', 'gpt-4-0125', 'gpt-4o', 'gpt-3.5-turbo-1106', 'gpt-3.5-turbo-0125')
+
+# The AI model is skipped while the health factor is above HEALTH_FACTOR_MIN
+# times this multiplier and no price moved more than CALM_PRICE_CHANGE_PCT
+SAFE_HEALTH_FACTOR_MULTIPLIER = 1.8
+CALM_PRICE_CHANGE_PCT = 2.0
+
+# Number of AI recommendations cached, and how long (in seconds) each is reused
+RECOMMENDATION_CACHE_SIZE = 512
+RECOMMENDATION_CACHE_TTL = 300
+
+# Number of price and position data points kept in history
+HISTORY_SIZE = 1000
+
+# Number of most recent prices used to calculate volatility
+VOLATILITY_WINDOW = 10
+
+# Columns of the price and position history buffers
+PRICE_HISTORY_COLUMNS = {
+    'timestamp': np.int64,
+    'price': np.float64
+}
+POSITION_HISTORY_COLUMNS = {
+    'timestamp': np.int64,
+    'total_collateral_eth': np.float64,
+    'total_debt_eth': np.float64,
+    'available_borrow_eth': np.float64,
+    'current_liquidation_threshold': np.float64,
+    'ltv': np.float64,
+    'health_factor': np.float64
+}
 
 class AIPositionManager:
     """
@@ -28,95 +93,215 @@ class AIPositionManager:
         """
         self.aave_manager = aave_manager
         self.chainlink_oracle = chainlink_oracle
-        self.price_history = {}
-        self.position_history = []
         
-    def collect_market_data(self):
+        # Price history per pair, indexed by the oracle's pair ID
+        self.price_history = [
+            RingBuffer(HISTORY_SIZE, **PRICE_HISTORY_COLUMNS)
+            for _ in chainlink_oracle.pair_names
+        ]
+        self.position_history = RingBuffer(HISTORY_SIZE, **POSITION_HISTORY_COLUMNS)
+        
+        # LRU cache of AI recommendations keyed by a quantized market/position state
+        self._recommendation_cache = OrderedDict()
+        
+        # The OpenAI client is created on first use, since it requires an API key
+        self._openai_client = None
+        
+        # Hash of the transaction sent by the last executed recommendation
+        self.last_tx_hash = None
+    
+    def snapshot(self):
+        """
+        Fetch the Aave account data and all Chainlink prices in one round-trip.
+        
+        The getUserAccountData() call and every latestRoundData() call are
+        batched into a single Multicall3 aggregate. If the multicall fails,
+        the data is fetched with separate calls instead. While every price is
+        cached, e.g. kept current by the oracle's subscription, only the
+        account data is fetched.
+        
+        Returns:
+            tuple: (user_data, prices) dictionaries.
+        """
+        prices = self.chainlink_oracle.get_cached_prices()
+        if prices is not None:
+            return self.aave_manager.get_user_account_data(), prices
+        
+        try:
+            return self._multicall_snapshot()
+        except Exception as e:
+            print(f"Error taking multicall snapshot, falling back to individual calls: {e}")
+            return self.aave_manager.get_user_account_data(), self.chainlink_oracle.get_all_prices()
+    
+    async def snapshot_async(self):
+        """
+        Fetch the Aave account data and all Chainlink prices without blocking.
+        
+        Uses the Multicall3 snapshot when possible. Otherwise the individual
+        calls are issued concurrently instead of one after the other. While
+        every price is cached, only the account data is fetched.
+        
+        Returns:
+            tuple: (user_data, prices) dictionaries.
+        """
+        prices = self.chainlink_oracle.get_cached_prices()
+        if prices is not None:
+            return await self.aave_manager.get_user_account_data_async(), prices
+        
+        try:
+            return await asyncio.to_thread(self._multicall_snapshot)
+        except Exception as e:
+            print(f"Error taking multicall snapshot, falling back to concurrent calls: {e}")
+            user_data, prices = await asyncio.gather(
+                self.aave_manager.get_user_account_data_async(),
+                self.chainlink_oracle.get_all_prices_async()
+            )
+            return user_data, prices
+    
+    def _multicall_snapshot(self):
+        """
+        Fetch the Aave account data and all Chainlink prices in one Multicall3 call.
+        
+        Returns:
+            tuple: (user_data, prices) dictionaries.
+            
+        Raises:
+            ValueError: If the getUserAccountData() call reverted.
+        """
+        oracle = self.chainlink_oracle
+        
+        calls = [self.aave_manager.user_account_data_call]
+        calls.extend(oracle.latest_round_calldata)
+        results = aggregate3(oracle.multicall, calls)
+        
+        success, return_data = results[0]
+        if not success:
+            raise ValueError("getUserAccountData() reverted")
+        
+        user_data = self.aave_manager.decode_user_account_data(return_data)
+        prices = oracle.decode_latest_round_results(results[1:])
+        
+        return user_data, prices
+        
+    def collect_market_data(self, prices=None, record_history=True):
         """
         Collect current market data from Chainlink oracles.
         
+        Args:
+            prices (dict, optional): Previously fetched prices. If not
+                provided, they are fetched from the oracles.
+            record_history (bool, optional): Whether to append the prices to
+                the price history. Defaults to True.
+        
         Returns:
             dict: Current market data.
         """
-        current_prices = self.chainlink_oracle.get_all_prices()
-        timestamp = int(time.time())
+        current_prices = prices if prices is not None else self.chainlink_oracle.get_all_prices()
         
-        # Store price history for analysis
-        for pair, price in current_prices.items():
-            if pair not in self.price_history:
-                self.price_history[pair] = []
-            
-            self.price_history[pair].append({
-                'timestamp': timestamp,
-                'price': price
-            })
+        if record_history:
+            timestamp = int(time.time())
             
-            # Keep only the last 1000 price points
-            if len(self.price_history[pair]) > 1000:
-                self.price_history[pair] = self.price_history[pair][-1000:]
+            # Store price history for analysis (only the last HISTORY_SIZE price points are kept)
+            pair_ids = self.chainlink_oracle.pair_ids
+            for pair, price in current_prices.items():
+                self.price_history[pair_ids[pair]].append(timestamp=timestamp, price=price)
         
         return current_prices
     
-    def collect_position_data(self):
+    def collect_position_data(self, user_data=None, record_history=True):
         """
         Collect current position data from Aave.
         
+        Args:
+            user_data (dict, optional): Previously fetched user account data.
+                If not provided, it is fetched from Aave.
+            record_history (bool, optional): Whether to append the position to
+                the position history. Defaults to True.
+        
         Returns:
             dict: Current position data.
         """
-        user_data = self.aave_manager.get_user_account_data()
+        if user_data is None:
+            user_data = self.aave_manager.get_user_account_data()
         timestamp = int(time.time())
         
         position_data = {
             'timestamp': timestamp,
-            'total_collateral_eth': user_data['total_collateral_eth'] / 1e18,
-            'total_debt_eth': user_data['total_debt_eth'] / 1e18,
-            'available_borrow_eth': user_data['available_borrow_eth'] / 1e18,
-            'current_liquidation_threshold': user_data['current_liquidation_threshold'] / 10000,  # Convert from basis points
-            'ltv': user_data['ltv'] / 10000,  # Convert from basis points
-            'health_factor': user_data['health_factor'] / 1e18  # Convert from Wei
+            'total_collateral_eth': user_data['total_collateral_eth'] / WAD,
+            'total_debt_eth': user_data['total_debt_eth'] / WAD,
+            'available_borrow_eth': user_data['available_borrow_eth'] / WAD,
+            'current_liquidation_threshold': user_data['current_liquidation_threshold'] / BPS,  # Convert from basis points
+            'ltv': user_data['ltv'] / BPS,  # Convert from basis points
+            'health_factor': user_data['health_factor'] / WAD  # Convert from Wei
         }
         
-        # Store position history for analysis
-        self.position_history.append(position_data)
-        
-        # Keep only the last 1000 position data points
-        if len(self.position_history) > 1000:
-            self.position_history = self.position_history[-1000:]
+        # Store position history for analysis (only the last HISTORY_SIZE points are kept)
+        if record_history:
+            self.position_history.append(**position_data)
         
         return position_data
     
-    def prepare_data_for_ai(self):
+    def calculate_price_changes(self):
+        """
+        Calculate the percentage change between the last two prices of each pair.
+        
+        Returns:
+            dict: A dictionary mapping pairs to their price change in percent.
+        """
+        pair_ids = [pair_id for pair_id, history in enumerate(self.price_history) if len(history) > 1]
+        if not pair_ids:
+            return {}
+        
+        # Compute the changes for all pairs at once on a (pairs, 2) array
+        prices = np.stack([self.price_history[pair_id].tail('price', 2) for pair_id in pair_ids])
+        price_changes_pct = (prices[:, 1] - prices[:, 0]) / prices[:, 0] * 100
+        
+        pair_names = self.chainlink_oracle.pair_names
+        return dict(zip((pair_names[pair_id] for pair_id in pair_ids), price_changes_pct.tolist()))
+    
+    def calculate_volatility(self):
+        """
+        Calculate the volatility of each pair over the last VOLATILITY_WINDOW prices.
+        
+        Returns:
+            dict: A dictionary mapping pairs to their coefficient of variation in percent.
+        """
+        # Need at least 10 data points for meaningful volatility
+        pair_ids = [
+            pair_id for pair_id, history in enumerate(self.price_history)
+            if len(history) > VOLATILITY_WINDOW
+        ]
+        if not pair_ids:
+            return {}
+        
+        # Coefficient of variation as percentage, for all pairs at once on a (pairs, window) array
+        prices = np.stack([self.price_history[pair_id].tail('price', VOLATILITY_WINDOW) for pair_id in pair_ids])
+        volatility_pct = prices.std(axis=1) / prices.mean(axis=1) * 100
+        
+        pair_names = self.chainlink_oracle.pair_names
+        return dict(zip((pair_names[pair_id] for pair_id in pair_ids), volatility_pct.tolist()))
+    
+    def prepare_data_for_ai(self, user_data=None, prices=None, record_history=True):
         """
         Prepare data to be sent to the AI model.
         
+        Args:
+            user_data (dict, optional): Previously fetched user account data.
+            prices (dict, optional): Previously fetched prices.
+            record_history (bool, optional): Whether to append the data to the
+                history. Pass False if it was already recorded. Defaults to True.
+        
         Returns:
             dict: Data prepared for AI analysis.
         """
-        market_data = self.collect_market_data()
-        position_data = self.collect_position_data()
-        
-        # Calculate price changes
-        price_changes = {}
-        for pair, history in self.price_history.items():
-            if len(history) > 1:
-                current_price = history[-1]['price']
-                previous_price = history[-2]['price']
-                price_change_pct = (current_price - previous_price) / previous_price * 100
-                price_changes[pair] = price_change_pct
-        
-        # Calculate volatility (standard deviation of price changes)
-        volatility = {}
-        for pair, history in self.price_history.items():
-            if len(history) > 10:  # Need at least 10 data points for meaningful volatility
-                prices = [point['price'] for point in history[-10:]]
-                volatility[pair] = np.std(prices) / np.mean(prices) * 100  # Coefficient of variation as percentage
+        market_data = self.collect_market_data(prices=prices, record_history=record_history)
+        position_data = self.collect_position_data(user_data=user_data, record_history=record_history)
         
         # Prepare the data structure for AI
         ai_data = {
             'current_prices': market_data,
-            'price_changes_pct': price_changes,
-            'volatility_pct': volatility,
+            'price_changes_pct': self.calculate_price_changes(),
+            'volatility_pct': self.calculate_volatility(),
             'position': position_data,
             'liquidation_threshold_buffer': LIQUIDATION_THRESHOLD_BUFFER,
             'health_factor_min': HEALTH_FACTOR_MIN,
@@ -125,36 +310,77 @@ class AIPositionManager:
         
         return ai_data
     
-    def get_ai_recommendation(self):
+    def get_ai_recommendation(self, user_data=None, prices=None, record_history=True):
         """
         Get a recommendation from the AI model based on current data.
         
+        Args:
+            user_data (dict, optional): Previously fetched user account data.
+            prices (dict, optional): Previously fetched prices.
+            record_history (bool, optional): Whether to append the data to the
+                history. Pass False if it was already recorded. Defaults to True.
+        
         Returns:
             dict: AI recommendation.
         """
-        data = self.prepare_data_for_ai()
+        data = self.prepare_data_for_ai(user_data=user_data, prices=prices, record_history=record_history)
+        
+        # No need to ask the AI model while the position is comfortably safe
+        health_factor = data['position']['health_factor']
+        max_price_change = max((abs(change) for change in data['price_changes_pct'].values()), default=0.0)
+        if health_factor > HEALTH_FACTOR_MIN * SAFE_HEALTH_FACTOR_MULTIPLIER and max_price_change < CALM_PRICE_CHANGE_PCT:
+            return {
+                'action': 'none',
+                'reason': 'Health factor well above the minimum and prices are stable',
+                'confidence': 95
+            }
+        
+        # Reuse the last 'none' recommendation if the state has not materially changed
+        cache_key = (self._state_signature(data), int(time.time() // RECOMMENDATION_CACHE_TTL))
+        if cache_key in self._recommendation_cache:
+            self._recommendation_cache.move_to_end(cache_key)
+            return dict(self._recommendation_cache[cache_key])
         
         # Convert data to a format suitable for the AI model
         prompt = self._create_prompt(data)
         
         try:
-            # Call the OpenAI API
-            response = openai.ChatCompletion.create(
-                model=AI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an AI financial advisor specialized in DeFi position management. Your task is to analyze the provided market and position data and recommend actions to prevent liquidation."},
+            request = {
+                'model': AI_MODEL,
+                'messages': [
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.3,
-                max_tokens=500
-            )
+                'temperature': 0.3,
+                'max_tokens': 500,
+                'seed': COMPLETION_SEED,
+                'stream': True
+            }
+            
+            # JSON mode guarantees the response is a single JSON object
+            if AI_MODEL.startswith(JSON_MODE_MODELS):
+                request['response_format'] = {"type": "json_object"}
+            
+            # Call the OpenAI API
+            if self._openai_client is None:
+                self._openai_client = OpenAI(api_key=OPENAI_API_KEY)
+            response = self._openai_client.chat.completions.create(**request)
             
-            # Extract the recommendation
-            recommendation_text = response.choices[0].message.content
+            # Extract the recommendation, stopping as soon as the JSON object is complete
+            recommendation_text = self._read_streamed_json(response)
             
             # Parse the recommendation
             recommendation = self._parse_recommendation(recommendation_text)
             
+            # Only 'none' is cached: the state an action responds to does not
+            # change until its transaction is mined, so a cached action would
+            # be executed again. Fallbacks for unparseable responses have zero
+            # confidence and are not cached either, so the next tick asks again.
+            if recommendation['action'] == 'none' and recommendation['confidence'] != 0:
+                self._recommendation_cache[cache_key] = dict(recommendation)
+                if len(self._recommendation_cache) > RECOMMENDATION_CACHE_SIZE:
+                    self._recommendation_cache.popitem(last=False)
+            
             return recommendation
         
         except Exception as e:
@@ -165,66 +391,104 @@ class AIPositionManager:
                 'confidence': 0
             }
     
+    def _state_signature(self, data):
+        """
+        Build a coarse, hashable summary of the data sent to the AI model.
+        
+        States with the same signature are expected to get the same recommendation.
+        
+        Args:
+            data (dict): Data prepared for AI analysis.
+            
+        Returns:
+            tuple: The rounded health factor, LTV and price changes.
+        """
+        return (
+            round(data['position']['health_factor'], 2),
+            round(data['position']['ltv'], 3),
+            tuple(sorted((pair, round(change, 1)) for pair, change in data['price_changes_pct'].items()))
+        )
+    
+    def _read_streamed_json(self, response):
+        """
+        Read a streamed completion until the first JSON object is complete.
+        
+        Braces inside JSON strings are ignored, so only the closing brace of
+        the outermost object ends the read. The stream is closed as soon as
+        it has been seen.
+        
+        Args:
+            response: The streamed chat completion.
+            
+        Returns:
+            str: The text received, up to the closing brace of the first JSON object.
+        """
+        parts = []
+        depth = 0
+        in_string = False
+        escaped = False
+        
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                
+                content = getattr(chunk.choices[0].delta, 'content', None)
+                if not content:
+                    continue
+                
+                for index, char in enumerate(content):
+                    if in_string:
+                        if escaped:
+                            escaped = False
+                        elif char == '\\':
+                            escaped = True
+                        elif char == '"':
+                            in_string = False
+                    elif char == '"' and depth > 0:
+                        in_string = True
+                    elif char == '{':
+                        depth += 1
+                    elif char == '}' and depth > 0:
+                        depth -= 1
+                        
+                        # Stop reading once the outermost object has been closed
+                        if depth == 0:
+                            parts.append(content[:index + 1])
+                            return ''.join(parts)
+                
+                parts.append(content)
+        finally:
+            # openai.Stream has no close() of its own, only the underlying HTTP response
+            close = getattr(response, 'close', None) or getattr(getattr(response, 'response', None), 'close', None)
+            if close is not None:
+                close()
+        
+        return ''.join(parts)
+    
     def _create_prompt(self, data):
         """
         Create a prompt for the AI model.
         
+        The data is encoded as compact JSON using the keys described in
+        SYSTEM_PROMPT, to keep the number of input tokens small.
+        
         Args:
             data (dict): Data to include in the prompt.
             
         Returns:
             str: The prompt for the AI model.
         """
-        prompt = f"""
-        Please analyze the following DeFi position data and market conditions:
-        
-        Current Position:
-        - Total Collateral (ETH): {data['position']['total_collateral_eth']}
-        - Total Debt (ETH): {data['position']['total_debt_eth']}
-        - Available Borrow (ETH): {data['position']['available_borrow_eth']}
-        - Current Liquidation Threshold: {data['position']['current_liquidation_threshold']}
-        - LTV: {data['position']['ltv']}
-        - Health Factor: {data['position']['health_factor']}
-        
-        Market Data:
-        """
+        position = data['position']
         
-        for pair, price in data['current_prices'].items():
-            prompt += f"- {pair}: {price}"
-            if pair in data['price_changes_pct']:
-                prompt += f" (24h change: {data['price_changes_pct'][pair]:.2f}%)"
-            if pair in data['volatility_pct']:
-                prompt += f" (Volatility: {data['volatility_pct'][pair]:.2f}%)"
-            prompt += "\n"
-        
-        prompt += f"""
-        Parameters:
-        - Liquidation Threshold Buffer: {data['liquidation_threshold_buffer']}
-        - Minimum Health Factor: {data['health_factor_min']}
-        
-        Based on this information, please recommend one of the following actions:
-        1. Add more collateral (specify amount and asset)
-        2. Repay some debt (specify amount and asset)
-        3. Withdraw collateral (specify amount and asset)
-        4. Borrow more (specify amount and asset)
-        5. No action needed
-        
-        For each recommendation, provide:
-        - The specific action to take
-        - The reason for the recommendation
-        - Your confidence level (0-100%)
-        
-        Format your response as a JSON object with the following structure:
-        {
-            "action": "add_collateral|repay_debt|withdraw_collateral|borrow_more|none",
-            "asset": "ETH|USDC|...",
-            "amount": 0.0,
-            "reason": "Your reasoning here",
-            "confidence": 85
+        payload = {
+            'pos': [round(position[field], 4) for field in PROMPT_POSITION_FIELDS],
+            'px': {pair: round(price, 2) for pair, price in data['current_prices'].items()},
+            'dpx': {pair: round(change, 3) for pair, change in data['price_changes_pct'].items()},
+            'vol': {pair: round(volatility, 3) for pair, volatility in data['volatility_pct'].items()}
         }
-        """
         
-        return prompt
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY).decode()
     
     def _parse_recommendation(self, recommendation_text):
         """
@@ -243,7 +507,7 @@ class AIPositionManager:
             
             if start_idx >= 0 and end_idx > start_idx:
                 json_str = recommendation_text[start_idx:end_idx]
-                recommendation = json.loads(json_str)
+                recommendation = orjson.loads(json_str)
                 
                 # Validate the recommendation
                 required_keys = ['action', 'reason', 'confidence']
@@ -304,6 +568,7 @@ class AIPositionManager:
             if action == 'add_collateral':
                 # Deposit more collateral
                 tx_hash = self.aave_manager.deposit(asset_address, amount_wei)
+                self.last_tx_hash = tx_hash
                 print(f"Added {amount} {asset} as collateral. Transaction hash: {tx_hash}")
                 return True
             
@@ -311,12 +576,14 @@ class AIPositionManager:
                 # Repay some debt
                 # Assuming variable interest rate (2)
                 tx_hash = self.aave_manager.repay(asset_address, amount_wei, 2)
+                self.last_tx_hash = tx_hash
                 print(f"Repaid {amount} {asset} of debt. Transaction hash: {tx_hash}")
                 return True
             
             elif action == 'withdraw_collateral':
                 # Withdraw some collateral
                 tx_hash = self.aave_manager.withdraw(asset_address, amount_wei)
+                self.last_tx_hash = tx_hash
                 print(f"Withdrew {amount} {asset} of collateral. Transaction hash: {tx_hash}")
                 return True
             
@@ -324,6 +591,7 @@ class AIPositionManager:
                 # Borrow more
                 # Assuming variable interest rate (2)
                 tx_hash = self.aave_manager.borrow(asset_address, amount_wei, 2)
+                self.last_tx_hash = tx_hash
                 print(f"Borrowed {amount} {asset}. Transaction hash: {tx_hash}")
                 return True
             
@@ -1,6 +1,22 @@
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import orjson
+import websockets
+from eth_abi import decode
+from hexbytes import HexBytes
 from web3 import Web3
-from utils.web3_utils import get_web3_connection
-from config.config import CHAINLINK_FEED_REGISTRY, PRICE_FEEDS
+from utils.web3_utils import (
+    get_web3_connection,
+    get_async_web3_connection,
+    batch_eth_call,
+    checksum
+)
+from utils.multicall import get_multicall_contract, aggregate3
+from utils.retry import retryable
+from config.config import CHAINLINK_FEED_REGISTRY, PRICE_FEEDS, WS_PROVIDER_URL
 
 # ABI for Chainlink Price Feed
 PRICE_FEED_ABI = [
@@ -16,25 +32,132 @@ PRICE_FEED_ABI = [
         ],
         "stateMutability": "view",
         "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [
+            {"internalType": "uint8", "name": "", "type": "uint8"}
+        ],
+        "stateMutability": "view",
+        "type": "function"
     }
 ]
 
+# Calldata of latestRoundData() (takes no arguments, so it is just the selector 0xfeaf968c)
+LATEST_ROUND_DATA_SELECTOR = Web3.to_hex(Web3.keccak(text="latestRoundData()")[:4])
+
+# Output types of latestRoundData(), used to decode raw eth_call return data
+LATEST_ROUND_DATA_TYPES = ['uint80', 'int256', 'uint256', 'uint256', 'uint80']
+
+# Maximum number of feeds read concurrently when they cannot be batched
+MAX_CONCURRENT_READS = 16
+
+# Calldata of decimals(), read once per feed to scale the answers
+DECIMALS_SELECTOR = Web3.to_hex(Web3.keccak(text="decimals()")[:4])
+
+# Calldata of aggregator(), which returns the aggregator behind a feed proxy
+AGGREGATOR_SELECTOR = Web3.to_hex(Web3.keccak(text="aggregator()")[:4])
+
+# Topic of AnswerUpdated(int256 indexed current, uint256 indexed roundId, uint256 updatedAt),
+# emitted by the aggregator on every new answer
+ANSWER_UPDATED_TOPIC = Web3.to_hex(Web3.keccak(text="AnswerUpdated(int256,uint256,uint256)"))
+
+# Seconds between checks of a subscription's aggregators, since a proxy can be
+# re-pointed to a new aggregator whose events the subscription would miss
+AGGREGATOR_CHECK_INTERVAL = 600
+
+@lru_cache(maxsize=None)
+def get_price_feed_factory(web3):
+    """
+    Get the price feed contract factory for a connection.
+    
+    The ABI is parsed once per connection and shared by every oracle using
+    it. Connections are process-wide singletons, so the cache stays small.
+    
+    Args:
+        web3 (Web3): The connection.
+        
+    Returns:
+        type: The contract factory.
+    """
+    return web3.eth.contract(abi=PRICE_FEED_ABI)
+
 class ChainlinkOracle:
     """
     Class to interact with Chainlink price feeds.
     """
     
-    def __init__(self):
+    def __init__(self, cache_ttl=5.0, subscription_max_age=3600.0):
+        """
+        Initialize the Chainlink oracle.
+        
+        Args:
+            cache_ttl (float, optional): Number of seconds for which a price
+                is reused before being fetched again. Defaults to 5.0.
+            subscription_max_age (float, optional): Number of seconds for
+                which a price kept current by subscribe() is reused without
+                a new event. Feeds update at least once per heartbeat, so
+                this should match the longest feed heartbeat. Defaults to 3600.0.
+        """
         self.web3 = get_web3_connection()
         self.price_feeds = {}
         
-        # Initialize price feed contracts
+        # Every price feed contract is created from the same shared factory
+        price_feed_factory = get_price_feed_factory(self.web3)
+        
+        # Initialize price feed contracts (pair names are interned so that
+        # lookups with the same literals compare by identity)
         for pair, address in PRICE_FEEDS.items():
             if address:
-                self.price_feeds[pair] = self.web3.eth.contract(
-                    address=self.web3.to_checksum_address(address),
-                    abi=PRICE_FEED_ABI
+                self.price_feeds[sys.intern(pair)] = price_feed_factory(
+                    address=checksum(address)
                 )
+        
+        # Integer IDs for the configured pairs, so per-pair data can be kept
+        # in lists indexed by ID instead of dicts keyed by pair name
+        self.pair_names = tuple(self.price_feeds)
+        self.pair_set = frozenset(self.pair_names)
+        self.pair_ids = {pair: pair_id for pair_id, pair in enumerate(self.pair_names)}
+        
+        # Multicall3 lets us read every feed in a single eth_call
+        self.multicall = get_multicall_contract(self.web3)
+        
+        # The latestRoundData() call for each feed, ready for Multicall3
+        self.latest_round_calls = [
+            (pair, (price_feed.address, LATEST_ROUND_DATA_SELECTOR))
+            for pair, price_feed in self.price_feeds.items()
+        ]
+        
+        # Just the (address, calldata) pairs, built once for every batched read
+        self.latest_round_calldata = [call for _, call in self.latest_round_calls]
+        
+        # The same calls as eth_call parameters, for reading a single feed
+        self.latest_round_params = {
+            pair: {'to': address, 'data': calldata}
+            for pair, (address, calldata) in self.latest_round_calls
+        }
+        
+        # Feed decimals never change, so the scale factor of each answer is
+        # read once and kept as a reciprocal: reads are a single multiply
+        self.decimals = self._read_decimals()
+        self._inv_scale = {
+            pair: 1.0 / 10**decimals
+            for pair, decimals in self.decimals.items()
+        }
+        
+        # Feeds only update on deviation or heartbeat, so recent raw answers
+        # are reused: pair -> (fetched_at, answer)
+        self.cache_ttl = cache_ttl
+        self._price_cache = {}
+        
+        # Pairs whose cached answers are kept current by subscribe(), so they
+        # expire after subscription_max_age instead of cache_ttl
+        self.subscription_max_age = subscription_max_age
+        self._subscribed_pairs = set()
+        
+        # The async connection is created on first use
+        self.async_web3 = None
     
     def get_latest_price(self, pair):
         """
@@ -49,59 +172,414 @@ class ChainlinkOracle:
         Raises:
             ValueError: If the pair is not supported.
         """
-        if pair not in self.price_feeds:
-            raise ValueError(f"Price feed for {pair} not configured")
+        # Convert the raw answer to a human-readable format
+        return self.get_latest_price_raw(pair) * self._inv_scale[pair]
+    
+    @retryable()
+    def get_latest_price_raw(self, pair):
+        """
+        Get the latest raw answer for a given pair, without scaling.
         
-        price_feed = self.price_feeds[pair]
+        The answer is an integer with self.decimals[pair] decimals (usually 8
+        for USD pairs), so arithmetic on it is exact. Compare it with
+        thresholds scaled by the same factor. Transient provider errors are
+        retried with exponential backoff.
         
-        # Get the latest round data
-        round_data = price_feed.functions.latestRoundData().call()
+        Args:
+            pair (str): The trading pair, e.g., 'ETH/USD'.
+            
+        Returns:
+            int: The latest answer.
+            
+        Raises:
+            ValueError: If the pair is not supported.
+        """
+        answer = self._cached_answer(pair)
+        if answer is not None:
+            return answer
         
-        # Extract the price and convert it to a human-readable format
-        # The price is usually returned with 8 decimals
-        price = round_data[1] / 10**8
+        # Get the latest round data and extract the answer
+        answer = self._get_latest_round_data(pair)[1]
         
-        return price
+        self._price_cache[pair] = (time.monotonic(), answer)
+        return answer
     
     def get_all_prices(self):
         """
         Get the latest prices for all configured pairs.
         
+        Cached prices are returned while every pair is fresh. Otherwise all
+        feeds are read in a single Multicall3 round-trip. Feeds whose
+        call fails are skipped. If the multicall itself fails (e.g. Multicall3
+        is not deployed on the network), the feeds are read with one JSON-RPC
+        batch, and if the provider rejects batches, the feeds are read concurrently.
+        
         Returns:
             dict: A dictionary mapping pairs to their latest prices.
         """
-        prices = {}
+        if not self.latest_round_calls:
+            return {}
+        
+        prices = self.get_cached_prices()
+        if prices is not None:
+            return prices
+        
+        calls = self.latest_round_calldata
         
-        for pair in self.price_feeds:
+        try:
+            results = aggregate3(self.multicall, calls)
+        except Exception as e:
+            print(f"Error reading prices via Multicall3, falling back to a JSON-RPC batch: {e}")
+            
             try:
-                prices[pair] = self.get_latest_price(pair)
+                results = batch_eth_call(calls)
             except Exception as e:
-                print(f"Error getting price for {pair}: {e}")
+                print(f"Error reading prices via JSON-RPC batch, falling back to individual calls: {e}")
+                return self._get_all_prices_concurrent()
+        
+        return self.decode_latest_round_results(results)
+    
+    def get_cached_prices(self):
+        """
+        Get the prices of all configured pairs from the cache, without any RPC.
+        
+        Returns:
+            dict: A dictionary mapping pairs to their latest prices, or None
+                if any pair has no fresh cached price.
+        """
+        # Bind the lookups used per pair once, outside the loops
+        cached_answer = self._cached_answer
+        inv_scale = self._inv_scale
+        
+        answers = {pair: cached_answer(pair) for pair in self.pair_names}
+        if None in answers.values():
+            return None
+        
+        return {pair: answer * inv_scale[pair] for pair, answer in answers.items()}
+    
+    def decode_latest_round_results(self, results):
+        """
+        Decode Multicall3 or JSON-RPC batch results of the pre-encoded latestRoundData() calls.
+        
+        Args:
+            results (list): (success, return_data) tuples, in the same order
+                as self.latest_round_calls.
+            
+        Returns:
+            dict: A dictionary mapping pairs to their latest prices.
+        """
+        prices = {}
+        fetched_at = time.monotonic()
+        price_cache = self._price_cache
+        inv_scale = self._inv_scale
+        
+        for pair, (success, return_data) in zip(self.pair_names, results):
+            if not success:
+                print(f"Error getting price for {pair}: latestRoundData() reverted")
+                continue
+            
+            answer = decode(LATEST_ROUND_DATA_TYPES, return_data)[1]
+            prices[pair] = answer * inv_scale[pair]
+            price_cache[pair] = (fetched_at, answer)
         
         return prices
     
-    def get_price_feed_update_time(self, pair):
+    async def subscribe(self, on_update=None, pairs=None):
         """
-        Get the timestamp of the last update for a given pair.
+        Keep cached prices current from AnswerUpdated events instead of polling.
+        
+        Opens a WebSocket to WS_PROVIDER_URL and subscribes to the
+        AnswerUpdated logs of the feeds' aggregators. Every event updates the
+        price cache, and while the subscription runs the cached answers of
+        the subscribed pairs are reused for up to subscription_max_age, so
+        price reads need no RPC. Runs until cancelled, until the connection
+        closes, or until the aggregator behind a feed changes, in which case
+        it returns so the caller can subscribe again.
+        
+        Args:
+            on_update (callable, optional): Called as on_update(pair, price, updated_at)
+                for every new answer.
+            pairs (list, optional): The pairs to subscribe to. Defaults to all pairs.
+            
+        Raises:
+            ValueError: If WS_PROVIDER_URL is not set or a pair is not supported.
+            websockets.ConnectionClosedError: If the connection is lost.
+        """
+        if not WS_PROVIDER_URL:
+            raise ValueError("WS_PROVIDER_URL is not configured")
+        
+        pairs = self.pair_names if pairs is None else pairs
+        for pair in pairs:
+            if pair not in self.pair_set:
+                raise ValueError(f"Price feed for {pair} not configured")
+        
+        # Proxies do not emit AnswerUpdated, the aggregators behind them do
+        aggregators = await asyncio.to_thread(self._resolve_aggregators, pairs)
+        
+        async with websockets.connect(WS_PROVIDER_URL) as websocket:
+            await websocket.send(orjson.dumps({
+                'jsonrpc': '2.0',
+                'id': 1,
+                'method': 'eth_subscribe',
+                'params': ['logs', {'address': list(aggregators), 'topics': [ANSWER_UPDATED_TOPIC]}]
+            }))
+            
+            response = orjson.loads(await websocket.recv())
+            if 'error' in response:
+                raise ValueError(f"Error subscribing to AnswerUpdated logs: {response['error']}")
+            subscription_id = response['result']
+            
+            # Seed the cache, since events only arrive when the answer changes
+            self.invalidate()
+            await asyncio.to_thread(self.get_all_prices)
+            self._subscribed_pairs.update(pairs)
+            
+            try:
+                next_check = time.monotonic() + AGGREGATOR_CHECK_INTERVAL
+                
+                while True:
+                    try:
+                        message = await asyncio.wait_for(
+                            websocket.recv(),
+                            timeout=max(next_check - time.monotonic(), 0)
+                        )
+                    except asyncio.TimeoutError:
+                        # A re-pointed proxy's new aggregator is not in the subscription
+                        if await asyncio.to_thread(self._resolve_aggregators, pairs) != aggregators:
+                            print("Price feed aggregators changed, subscription must be renewed")
+                            return
+                        
+                        next_check = time.monotonic() + AGGREGATOR_CHECK_INTERVAL
+                        continue
+                    
+                    message = orjson.loads(message)
+                    if message.get('method') != 'eth_subscription':
+                        continue
+                    if message['params']['subscription'] != subscription_id:
+                        continue
+                    
+                    update = self._handle_answer_updated(message['params']['result'], aggregators)
+                    if update is not None and on_update is not None:
+                        on_update(*update)
+            finally:
+                self._subscribed_pairs.difference_update(pairs)
+    
+    def _resolve_aggregators(self, pairs):
+        """
+        Look up the aggregator behind each feed proxy.
+        
+        Args:
+            pairs (list): The trading pairs.
+            
+        Returns:
+            dict: A dictionary mapping lowercase aggregator addresses to pairs.
+        """
+        aggregators = {}
+        
+        for pair in pairs:
+            return_data = self.web3.eth.call({'to': self.price_feeds[pair].address, 'data': AGGREGATOR_SELECTOR})
+            aggregator = decode(['address'], return_data)[0]
+            aggregators[aggregator.lower()] = pair
+        
+        return aggregators
+    
+    def _handle_answer_updated(self, log, aggregators):
+        """
+        Update the price cache from an AnswerUpdated log.
+        
+        Args:
+            log (dict): The log, as delivered by the logs subscription.
+            aggregators (dict): Lowercase aggregator addresses mapped to pairs.
+            
+        Returns:
+            tuple: (pair, price, updated_at), or None if the log was ignored.
+        """
+        pair = aggregators.get(log['address'].lower())
+        
+        # Logs are re-sent with removed set when their block is reorganized out
+        if pair is None or log.get('removed'):
+            return None
+        
+        answer = decode(['int256'], HexBytes(log['topics'][1]))[0]
+        updated_at = decode(['uint256'], HexBytes(log['data']))[0]
+        
+        self._price_cache[pair] = (time.monotonic(), answer)
+        return pair, answer * self._inv_scale[pair], updated_at
+    
+    def _read_decimals(self):
+        """
+        Read decimals() from every feed, in one Multicall3 call if possible.
+        
+        Returns:
+            dict: A dictionary mapping pairs to their number of decimals.
+        """
+        calls = [(price_feed.address, DECIMALS_SELECTOR) for price_feed in self.price_feeds.values()]
+        
+        try:
+            results = aggregate3(self.multicall, calls)
+        except Exception as e:
+            print(f"Error reading feed decimals via Multicall3, falling back to individual calls: {e}")
+            results = []
+        
+        decimals = {}
+        for pair, (success, return_data) in zip(self.price_feeds, results):
+            if success:
+                decimals[pair] = decode(['uint8'], return_data)[0]
+        
+        # Feeds missing from the multicall results are read individually
+        for pair, price_feed in self.price_feeds.items():
+            if pair not in decimals:
+                return_data = self.web3.eth.call({'to': price_feed.address, 'data': DECIMALS_SELECTOR})
+                decimals[pair] = decode(['uint8'], return_data)[0]
+        
+        return decimals
+    
+    def invalidate(self, pair=None):
+        """
+        Clear cached prices, so the next read fetches them from the feeds.
+        
+        Args:
+            pair (str, optional): The pair to clear. Defaults to all pairs.
+        """
+        if pair is None:
+            self._price_cache.clear()
+        else:
+            self._price_cache.pop(pair, None)
+    
+    def _cached_answer(self, pair):
+        """
+        Get the cached raw answer for a pair if it is still fresh.
         
         Args:
             pair (str): The trading pair, e.g., 'ETH/USD'.
             
         Returns:
-            int: The timestamp of the last update.
+            int: The cached answer, or None if it is missing or too old.
+        """
+        cached = self._price_cache.get(pair)
+        if cached is not None:
+            fetched_at, answer = cached
+            max_age = self.subscription_max_age if pair in self._subscribed_pairs else self.cache_ttl
+            if time.monotonic() - fetched_at < max_age:
+                return answer
+        return None
+    
+    def _get_all_prices_concurrent(self):
+        """
+        Get the latest prices for all configured pairs, one call per feed.
+        
+        The calls are made from a thread pool, so the round-trips overlap.
+        
+        Returns:
+            dict: A dictionary mapping pairs to their latest prices.
+        """
+        prices = {}
+        pairs = self.pair_names
+        get_price = self.get_latest_price
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_READS, len(pairs))) as executor:
+            submit = executor.submit
+            futures = {pair: submit(get_price, pair) for pair in pairs}
+            
+            for pair, future in futures.items():
+                try:
+                    prices[pair] = future.result()
+                except Exception as e:
+                    print(f"Error getting price for {pair}: {e}")
+        
+        return prices
+    
+    async def get_latest_price_async(self, pair):
+        """
+        Get the latest price for a given pair without blocking the event loop.
+        
+        Args:
+            pair (str): The trading pair, e.g., 'ETH/USD'.
+            
+        Returns:
+            float: The latest price.
             
         Raises:
             ValueError: If the pair is not supported.
         """
-        if pair not in self.price_feeds:
+        if pair not in self.pair_set:
             raise ValueError(f"Price feed for {pair} not configured")
         
-        price_feed = self.price_feeds[pair]
+        answer = self._cached_answer(pair)
+        
+        if answer is None:
+            if self.async_web3 is None:
+                self.async_web3 = get_async_web3_connection()
+            
+            return_data = await self.async_web3.eth.call(self.latest_round_params[pair])
+            answer = decode(LATEST_ROUND_DATA_TYPES, return_data)[1]
+            
+            self._price_cache[pair] = (time.monotonic(), answer)
+        
+        return answer * self._inv_scale[pair]
+    
+    async def get_all_prices_async(self):
+        """
+        Get the latest prices for all configured pairs concurrently.
         
+        Returns:
+            dict: A dictionary mapping pairs to their latest prices.
+        """
+        pairs = list(self.price_feeds)
+        results = await asyncio.gather(
+            *(self.get_latest_price_async(pair) for pair in pairs),
+            return_exceptions=True
+        )
+        
+        prices = {}
+        for pair, result in zip(pairs, results):
+            if isinstance(result, Exception):
+                print(f"Error getting price for {pair}: {result}")
+            else:
+                prices[pair] = result
+        
+        return prices
+    
+    def get_price_feed_update_time(self, pair):
+        """
+        Get the timestamp of the last update for a given pair.
+        
+        Args:
+            pair (str): The trading pair, e.g., 'ETH/USD'.
+            
+        Returns:
+            int: The timestamp of the last update.
+            
+        Raises:
+            ValueError: If the pair is not supported.
+        """
         # Get the latest round data
-        round_data = price_feed.functions.latestRoundData().call()
+        round_data = self._get_latest_round_data(pair)
         
         # Extract the updated at timestamp
         updated_at = round_data[3]
         
         return updated_at
+    
+    def _get_latest_round_data(self, pair):
+        """
+        Call latestRoundData() on the feed for a given pair.
+        
+        The pre-built call parameters are sent with a raw eth_call, which avoids
+        building a contract function object and re-encoding it on every read.
+        
+        Args:
+            pair (str): The trading pair, e.g., 'ETH/USD'.
+            
+        Returns:
+            tuple: (roundId, answer, startedAt, updatedAt, answeredInRound).
+            
+        Raises:
+            ValueError: If the pair is not supported.
+        """
+        if pair not in self.pair_set:
+            raise ValueError(f"Price feed for {pair} not configured")
+        
+        return_data = self.web3.eth.call(self.latest_round_params[pair])
+        
+        return decode(LATEST_ROUND_DATA_TYPES, return_data)
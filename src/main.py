@@ -1,21 +1,90 @@
-import time
+import asyncio
 import argparse
 import logging
+import queue
+import signal
+import time
+from logging.handlers import QueueHandler, QueueListener
 from src.aave_manager import AaveManager
 from src.chainlink_oracle import ChainlinkOracle
 from src.ai_position_manager import AIPositionManager
+from config.config import HEALTH_FACTOR_MIN, WS_PROVIDER_URL
+
+# Maximum number of log records waiting to be written by the listener thread
+LOG_QUEUE_SIZE = 10000
+
+# Seconds a WARNING or higher record waits for room in a full log queue
+LOG_ENQUEUE_TIMEOUT = 0.1
+
+# Seconds to wait before subscribing to price updates again after an error
+SUBSCRIPTION_RETRY_DELAY = 5
+
+# Seconds after which a transaction that was never mined no longer blocks
+# new recommendations from being executed
+PENDING_TX_TIMEOUT = 600
+
+logger = logging.getLogger("position_manager")
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops low-level records instead of blocking when the queue is full.
+    """
+    
+    def enqueue(self, record):
+        """
+        Put a record on the queue without blocking the caller for long.
+        
+        When the queue is full, records below WARNING are dropped. Records at
+        WARNING and above wait up to LOG_ENQUEUE_TIMEOUT seconds for the
+        listener to make room, then replace the oldest queued record.
+        
+        Args:
+            record (logging.LogRecord): The record to enqueue.
+        """
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                return
+        
+        try:
+            self.queue.put(record, timeout=LOG_ENQUEUE_TIMEOUT)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+
+def setup_logging():
+    """
+    Configure logging so that records are written on a background thread.
+    
+    Log calls only put records on a bounded queue; a listener thread formats
+    them and writes them to the log file and the console.
+    
+    Returns:
+        QueueListener: The started listener. Stop it on exit to flush the queue.
+    """
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
         logging.FileHandler("position_manager.log"),
         logging.StreamHandler()
     ]
-)
-
-logger = logging.getLogger("position_manager")
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # The queue handler only merges the message arguments; the listener's
+    # handlers apply the full format
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
 
 def parse_arguments():
     """
@@ -30,7 +99,21 @@ def parse_arguments():
         "--interval",
         type=int,
         default=300,
-        help="Monitoring interval in seconds (default: 300)"
+        help="Maximum interval between AI recommendations in seconds (default: 300)"
+    )
+    
+    parser.add_argument(
+        "--price-interval",
+        type=int,
+        default=15,
+        help="Maximum interval between position and price checks in seconds (default: 15)"
+    )
+    
+    parser.add_argument(
+        "--min-interval",
+        type=int,
+        default=5,
+        help="Minimum interval between checks in seconds when the position is at risk (default: 5)"
     )
     
     parser.add_argument(
@@ -48,12 +131,256 @@ def parse_arguments():
     
     return parser.parse_args()
 
+def get_poll_interval(health_factor, volatility, interval, min_interval):
+    """
+    Compute how long to wait before the next check.
+    
+    The wait shrinks as the health factor approaches HEALTH_FACTOR_MIN and
+    as prices become more volatile, so risky positions are checked more often.
+    
+    Args:
+        health_factor (float): The current health factor.
+        volatility (dict): Volatility in percent per pair.
+        interval (int): The maximum interval in seconds.
+        min_interval (int): The minimum interval in seconds.
+        
+    Returns:
+        float: The number of seconds to wait.
+    """
+    margin = (health_factor - HEALTH_FACTOR_MIN) / HEALTH_FACTOR_MIN
+    max_volatility = max(volatility.values(), default=1.0)
+    
+    poll_interval = interval * margin / max(max_volatility, 1e-3)
+    return min(max(poll_interval, min_interval), interval)
+
+class MonitorState:
+    """
+    Latest position and market snapshot, shared between the monitoring tasks.
+    """
+    
+    def __init__(self):
+        self.user_data = None
+        self.prices = None
+        
+        # Set once the first snapshot has been taken
+        self.ready = asyncio.Event()
+        
+        # Set when a snapshot shows the position is not safe
+        self.at_risk = asyncio.Event()
+        
+        # (tx_hash, sent_at) of the last executed recommendation, until it is mined
+        self.pending_tx = None
+
+async def price_poller(args, aave_manager, ai_manager, state):
+    """
+    Keep the shared snapshot of the position and prices up to date.
+    
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        aave_manager (AaveManager): The Aave manager.
+        ai_manager (AIPositionManager): The AI position manager.
+        state (MonitorState): The shared snapshot.
+    """
+    while True:
+        poll_interval = args.price_interval
+        
+        try:
+            # Fetch position and market data in a single round-trip,
+            # or with concurrent calls if Multicall3 is unavailable
+            state.user_data, state.prices = await ai_manager.snapshot_async()
+            state.ready.set()
+            
+            # Every snapshot goes into the history, so volatility reflects
+            # prices sampled at the polling rate
+            ai_manager.collect_market_data(prices=state.prices)
+            ai_manager.collect_position_data(user_data=state.user_data)
+            
+            # Check if position is safe
+            health_factor = aave_manager.get_health_factor(user_data=state.user_data)
+            logger.info("Current health factor: %s", health_factor)
+            
+            is_safe = aave_manager.is_position_safe(user_data=state.user_data)
+            logger.info("Position safe: %s", is_safe)
+            
+            logger.info("Current prices: %s", state.prices)
+            
+            # Wake the health watcher immediately if the position is at risk
+            if not is_safe:
+                state.at_risk.set()
+            
+            # Poll faster when the position is close to the minimum health factor
+            poll_interval = get_poll_interval(
+                health_factor,
+                ai_manager.calculate_volatility(),
+                args.price_interval,
+                args.min_interval
+            )
+        
+        except Exception as e:
+            logger.error("Error polling position and prices: %s", e)
+        
+        await asyncio.sleep(poll_interval)
+
+async def settle_pending_transaction(aave_manager, ai_manager, state):
+    """
+    Check whether the transaction of the last executed recommendation has been mined.
+    
+    Once it has, the snapshot is refreshed, so the next recommendation is
+    based on a position that includes its effect.
+    
+    Args:
+        aave_manager (AaveManager): The Aave manager.
+        ai_manager (AIPositionManager): The AI position manager.
+        state (MonitorState): The shared snapshot.
+        
+    Returns:
+        bool: True if no transaction is pending any more, False otherwise.
+    """
+    if state.pending_tx is None:
+        return True
+    
+    tx_hash, sent_at = state.pending_tx
+    
+    if not await asyncio.to_thread(aave_manager.is_transaction_mined, tx_hash):
+        if time.monotonic() - sent_at < PENDING_TX_TIMEOUT:
+            return False
+        
+        logger.warning("Transaction %s not mined after %s seconds, no longer waiting for it", tx_hash, PENDING_TX_TIMEOUT)
+    
+    state.pending_tx = None
+    state.user_data, state.prices = await ai_manager.snapshot_async()
+    return True
+
+async def health_watcher(args, aave_manager, ai_manager, state):
+    """
+    Periodically get an AI recommendation for the latest snapshot and act on it.
+    
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        aave_manager (AaveManager): The Aave manager.
+        ai_manager (AIPositionManager): The AI position manager.
+        state (MonitorState): The shared snapshot.
+    """
+    await state.ready.wait()
+    
+    while True:
+        poll_interval = args.interval
+        state.at_risk.clear()
+        
+        try:
+            # The snapshot does not reflect an unmined transaction, so acting
+            # on it again would repeat the same deposit or repay
+            if not await settle_pending_transaction(aave_manager, ai_manager, state):
+                logger.info("Waiting for transaction %s to be mined", state.pending_tx[0])
+                poll_interval = args.min_interval
+            else:
+                user_data, prices = state.user_data, state.prices
+                health_factor = aave_manager.get_health_factor(user_data=user_data)
+                
+                # Get AI recommendation without blocking the price poller. The
+                # price poller already recorded the snapshot in the history.
+                logger.info("Getting AI recommendation")
+                recommendation = await asyncio.to_thread(
+                    ai_manager.get_ai_recommendation,
+                    user_data=user_data,
+                    prices=prices,
+                    record_history=False
+                )
+                logger.info("AI recommendation: %s", recommendation)
+                
+                # Execute recommendation if not in dry-run mode
+                if not args.dry_run and recommendation['action'] != 'none':
+                    logger.info("Executing recommendation: %s", recommendation['action'])
+                    success = await asyncio.to_thread(ai_manager.execute_recommendation, recommendation)
+                    logger.info("Execution %s", 'successful' if success else 'failed')
+                    
+                    if success:
+                        state.pending_tx = (ai_manager.last_tx_hash, time.monotonic())
+                elif args.dry_run and recommendation['action'] != 'none':
+                    logger.info("Dry run mode: would execute %s", recommendation['action'])
+                
+                # Ask again sooner when the position is at risk
+                poll_interval = get_poll_interval(
+                    health_factor,
+                    ai_manager.calculate_volatility(),
+                    args.interval,
+                    args.min_interval
+                )
+        
+        except Exception as e:
+            logger.error("Error in monitoring loop: %s", e)
+        
+        # Wait for the next interval, or until the price poller flags the position
+        logger.info("Waiting for up to %.0f seconds", poll_interval)
+        try:
+            await asyncio.wait_for(state.at_risk.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def price_subscriber(chainlink_oracle):
+    """
+    Keep the oracle subscribed to price feed events, subscribing again after errors.
+    
+    While subscribed, the price poller reads prices from the oracle's cache.
+    
+    Args:
+        chainlink_oracle (ChainlinkOracle): The Chainlink oracle.
+    """
+    while True:
+        try:
+            logger.info("Subscribing to price feed updates")
+            await chainlink_oracle.subscribe()
+        except Exception as e:
+            logger.error("Error in price feed subscription: %s", e)
+            await asyncio.sleep(SUBSCRIPTION_RETRY_DELAY)
+
+async def monitor(args, aave_manager, ai_manager):
+    """
+    Run the price poller and health watcher until SIGINT or SIGTERM.
+    
+    If WS_PROVIDER_URL is set, the price feed subscription runs alongside
+    them. All tasks run in a task group, so an unexpected error in one
+    cancels the others.
+    
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+        aave_manager (AaveManager): The Aave manager.
+        ai_manager (AIPositionManager): The AI position manager.
+    """
+    state = MonitorState()
+    stop = asyncio.Event()
+    
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Signal handlers are not supported on Windows event loops
+            pass
+    
+    async with asyncio.TaskGroup() as task_group:
+        tasks = [
+            task_group.create_task(price_poller(args, aave_manager, ai_manager, state)),
+            task_group.create_task(health_watcher(args, aave_manager, ai_manager, state))
+        ]
+        
+        if WS_PROVIDER_URL:
+            tasks.append(task_group.create_task(price_subscriber(ai_manager.chainlink_oracle)))
+        
+        await stop.wait()
+        logger.info("Shutting down")
+        
+        for task in tasks:
+            task.cancel()
+
 def main():
     """
     Main function to run the position manager.
     """
     args = parse_arguments()
     
+    log_listener = setup_logging()
+    
     # Set log level
     logger.setLevel(getattr(logging, args.log_level))
     
@@ -71,47 +398,23 @@ def main():
         ai_manager = AIPositionManager(aave_manager, chainlink_oracle)
         
         # Main monitoring loop
-        logger.info(f"Starting monitoring loop with interval of {args.interval} seconds")
+        logger.info(
+            "Starting monitoring loop with intervals of %s seconds (prices) "
+            "and %s seconds (AI recommendations)",
+            args.price_interval,
+            args.interval
+        )
         
-        while True:
-            try:
-                # Check if position is safe
-                health_factor = aave_manager.get_health_factor()
-                logger.info(f"Current health factor: {health_factor}")
-                
-                is_safe = aave_manager.is_position_safe()
-                logger.info(f"Position safe: {is_safe}")
-                
-                # Get market data
-                prices = chainlink_oracle.get_all_prices()
-                logger.info(f"Current prices: {prices}")
-                
-                # Get AI recommendation
-                logger.info("Getting AI recommendation")
-                recommendation = ai_manager.get_ai_recommendation()
-                logger.info(f"AI recommendation: {recommendation}")
-                
-                # Execute recommendation if not in dry-run mode
-                if not args.dry_run and recommendation['action'] != 'none':
-                    logger.info(f"Executing recommendation: {recommendation['action']}")
-                    success = ai_manager.execute_recommendation(recommendation)
-                    logger.info(f"Execution {'successful' if success else 'failed'}")
-                elif args.dry_run and recommendation['action'] != 'none':
-                    logger.info(f"Dry run mode: would execute {recommendation['action']}")
-                
-                # Wait for the next interval
-                logger.info(f"Waiting for {args.interval} seconds")
-                time.sleep(args.interval)
-            
-            except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}")
-                logger.info(f"Waiting for {args.interval} seconds before retrying")
-                time.sleep(args.interval)
+        asyncio.run(monitor(args, aave_manager, ai_manager))
     
     except Exception as e:
-        logger.critical(f"Critical error: {e}")
+        logger.critical("Critical error: %s", e)
         return 1
     
+    finally:
+        # Write out any queued records before exiting
+        log_listener.stop()
+    
     return 0
 
 if __name__ == "__main__":
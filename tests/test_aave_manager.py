@@ -0,0 +1,165 @@
+import sys
+import os
+import itertools
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import aiohttp
+import requests
+from eth_abi import encode
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.aave_manager import AaveManager, HEALTH_FACTOR_MIN_WAD
+
+ASSET_ADDRESS = '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48'
+
+# getUserAccountData() return values and their ABI encoding
+USER_ACCOUNT_DATA = [10 * 10**18, 6 * 10**18, 0, 8000, 7500, 14 * 10**17]
+USER_ACCOUNT_DATA_RETURN = encode(['uint256'] * 6, USER_ACCOUNT_DATA)
+
+class TestAaveManager(unittest.TestCase):
+    """
+    Test cases for the AaveManager class.
+    """
+    
+    @patch('src.aave_manager.get_web3_connection')
+    @patch('src.aave_manager.AAVE_LENDING_POOL_ADDRESS', '0x87870Bca3F3fD6335C3F4ce8392D69350B4fA4E2')
+    @patch('src.aave_manager.AAVE_DATA_PROVIDER_ADDRESS', '0x7B4EB56E7CD4b454BA8ff71E4518426369a138a3')
+    @patch('src.aave_manager.WALLET_ADDRESS', '0x000000000000000000000000000000000000dEaD')
+    def setUp(self, mock_get_web3_connection):
+        """
+        Set up the test environment.
+        """
+        self.mock_web3 = MagicMock()
+        mock_get_web3_connection.return_value = self.mock_web3
+        self.mock_web3.eth.gas_price = 10**9
+        
+        # Built transactions are the transaction parameters themselves
+        self.lending_pool = self.mock_web3.eth.contract.return_value
+        for function in ('deposit', 'withdraw', 'borrow', 'repay'):
+            getattr(self.lending_pool.functions, function).return_value.build_transaction.side_effect = dict
+        
+        self.aave_manager = AaveManager()
+    
+    @patch('src.aave_manager.sign_and_send_transaction')
+    @patch('src.aave_manager.reset_nonce')
+    @patch('src.aave_manager.get_nonce')
+    def test_submit_many(self, mock_get_nonce, mock_reset_nonce, mock_sign_and_send_transaction):
+        """
+        Test that sequential nonces are reserved in the order of the actions.
+        """
+        mock_get_nonce.side_effect = itertools.count(7)
+        mock_sign_and_send_transaction.side_effect = lambda tx: f"0x{tx['nonce']:064x}"
+        
+        # Submit a deposit and a repay
+        tx_hashes = self.aave_manager.submit_many([
+            ('deposit', (ASSET_ADDRESS, 100)),
+            ('repay', (ASSET_ADDRESS, 50, 2))
+        ])
+        
+        # Check the hashes match the nonces reserved for each action, in order
+        self.assertEqual(tx_hashes, [f"0x{7:064x}", f"0x{8:064x}"])
+        sent_nonces = sorted(call[0][0]['nonce'] for call in mock_sign_and_send_transaction.call_args_list)
+        self.assertEqual(sent_nonces, [7, 8])
+        mock_reset_nonce.assert_not_called()
+    
+    @patch('src.aave_manager.sign_and_send_transaction')
+    @patch('src.aave_manager.reset_nonce')
+    @patch('src.aave_manager.get_nonce')
+    def test_submit_many_partial_failure(self, mock_get_nonce, mock_reset_nonce, mock_sign_and_send_transaction):
+        """
+        Test that the local nonce is reset when one of the transactions fails to send.
+        """
+        mock_get_nonce.side_effect = itertools.count(7)
+        
+        def send(tx):
+            if tx['nonce'] == 8:
+                raise ValueError("nonce too low")
+            return f"0x{tx['nonce']:064x}"
+        
+        mock_sign_and_send_transaction.side_effect = send
+        
+        # Submit two transactions, the second of which is rejected
+        with self.assertRaises(ValueError):
+            self.aave_manager.submit_many([
+                ('deposit', (ASSET_ADDRESS, 100)),
+                ('borrow', (ASSET_ADDRESS, 50, 2))
+            ])
+        
+        # Check the nonce is fetched from the node again next time
+        mock_reset_nonce.assert_called_once()
+    
+    def test_submit_many_unknown_action(self):
+        """
+        Test that unknown actions are rejected before any nonce is reserved.
+        """
+        with patch('src.aave_manager.get_nonce') as mock_get_nonce:
+            with self.assertRaises(ValueError):
+                self.aave_manager.submit_many([('stake', (ASSET_ADDRESS, 100))])
+            
+            mock_get_nonce.assert_not_called()
+    
+    def test_is_position_safe_boundaries(self):
+        """
+        Test the integer health factor compare at and around HEALTH_FACTOR_MIN_WAD.
+        """
+        cases = [
+            (HEALTH_FACTOR_MIN_WAD, False),       # Exactly at the minimum is not safe
+            (HEALTH_FACTOR_MIN_WAD - 1, False),   # One wei below
+            (HEALTH_FACTOR_MIN_WAD + 1, True),    # One wei above
+            (2**256 - 1, True),                   # Reported by Aave when there is no debt
+        ]
+        
+        for health_factor, expected in cases:
+            with self.subTest(health_factor=health_factor):
+                self.assertIs(self.aave_manager.is_position_safe({'health_factor': health_factor}), expected)
+    
+    def test_is_position_safe_without_debt_fetches_data(self):
+        """
+        Test that a fetched position without debt is safe.
+        """
+        self.mock_web3.eth.call.return_value = encode(['uint256'] * 6, [10 * 10**18, 0, 0, 8000, 7500, 2**256 - 1])
+        
+        self.assertTrue(self.aave_manager.is_position_safe())
+    
+    @patch('utils.retry.time.sleep')
+    def test_get_user_account_data_retries_transient_error(self, mock_sleep):
+        """
+        Test that account data is returned when a 503 is followed by a success.
+        """
+        self.mock_web3.eth.call.side_effect = [
+            requests.exceptions.HTTPError("503 Server Error: Service Unavailable"),
+            USER_ACCOUNT_DATA_RETURN
+        ]
+        
+        # Get the account data
+        user_data = self.aave_manager.get_user_account_data()
+        
+        # Check the call was retried once and its data decoded
+        self.assertEqual(user_data['health_factor'], USER_ACCOUNT_DATA[5])
+        self.assertEqual(self.mock_web3.eth.call.call_count, 2)
+        mock_sleep.assert_called_once()
+    
+    @patch('utils.retry.asyncio.sleep', new_callable=AsyncMock)
+    def test_get_user_account_data_async_retries_transient_error(self, mock_sleep):
+        """
+        Test that the async account data read is retried in the same way.
+        """
+        self.aave_manager.async_web3 = MagicMock()
+        self.aave_manager.async_web3.eth.call = AsyncMock(side_effect=[
+            aiohttp.ClientResponseError(MagicMock(), (), status=503),
+            USER_ACCOUNT_DATA_RETURN
+        ])
+        
+        # Get the account data
+        user_data = asyncio.run(self.aave_manager.get_user_account_data_async())
+        
+        # Check the call was retried once without blocking the event loop
+        self.assertEqual(user_data['health_factor'], USER_ACCOUNT_DATA[5])
+        self.assertEqual(self.aave_manager.async_web3.eth.call.await_count, 2)
+        mock_sleep.assert_awaited_once()
+
+if __name__ == '__main__':
+    unittest.main()
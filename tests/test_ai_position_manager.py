@@ -0,0 +1,271 @@
+import sys
+import os
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock, AsyncMock
+import orjson
+from eth_abi import encode
+from openai import OpenAI
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.ai_position_manager import AIPositionManager
+from utils import web3_utils
+from utils.multicall import get_multicall_contract
+
+# Account data of a position just below the minimum health factor
+AT_RISK_USER_DATA = {
+    'total_collateral_eth': 10 * 10**18,
+    'total_debt_eth': 6 * 10**18,
+    'available_borrow_eth': 0,
+    'current_liquidation_threshold': 8000,
+    'ltv': 7500,
+    'health_factor': 14 * 10**17
+}
+
+def make_chunk(content):
+    """
+    Build a fake streamed chat completion chunk.
+    """
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+class FakeStream:
+    """
+    Fake streamed chat completion that records how far it was read.
+    """
+    
+    def __init__(self, contents):
+        self.chunks = [make_chunk(content) for content in contents]
+        self.read = 0
+        self.response = MagicMock()
+    
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+# Account data of a position with a health factor of 3, well above the minimum
+SAFE_USER_DATA = dict(AT_RISK_USER_DATA, total_debt_eth=2 * 10**18, health_factor=3 * 10**18)
+
+class CountingSession:
+    """
+    Fake HTTP session that records the JSON-RPC methods posted and answers them.
+    """
+    
+    def __init__(self, results):
+        self.results = results
+        self.methods = []
+    
+    def post(self, url, data=None, **kwargs):
+        request = orjson.loads(data)
+        self.methods.append(request['method'])
+        
+        response = MagicMock()
+        response.content = orjson.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': self.results[request['method']]})
+        return response
+
+class TestAIPositionManager(unittest.TestCase):
+    """
+    Test cases for the AIPositionManager class.
+    """
+    
+    def setUp(self):
+        """
+        Set up the test environment.
+        """
+        self.mock_oracle = MagicMock()
+        self.mock_oracle.pair_names = ('ETH/USD',)
+        self.mock_oracle.pair_ids = {'ETH/USD': 0}
+        self.mock_aave_manager = MagicMock()
+        
+        self.ai_manager = AIPositionManager(self.mock_aave_manager, self.mock_oracle)
+    
+    @patch('src.ai_position_manager.aggregate3')
+    def test_snapshot_async_uses_cached_prices(self, mock_aggregate3):
+        """
+        Test that only the account data is fetched while every price is cached.
+        """
+        self.mock_oracle.get_cached_prices.return_value = {'ETH/USD': 2000.0}
+        self.mock_aave_manager.get_user_account_data_async = AsyncMock(return_value=AT_RISK_USER_DATA)
+        
+        # Take a snapshot
+        user_data, prices = asyncio.run(self.ai_manager.snapshot_async())
+        
+        # Check the cached prices were used without a multicall
+        self.assertEqual(user_data, AT_RISK_USER_DATA)
+        self.assertEqual(prices, {'ETH/USD': 2000.0})
+        mock_aggregate3.assert_not_called()
+    
+    @patch('utils.web3_utils.RPC_HTTP2', False)
+    def test_multicall_snapshot_is_one_request(self):
+        """
+        Test that each multicall snapshot sends a single eth_call, after a one-time eth_chainId.
+        """
+        aggregate_result = encode(['(bool,bytes)[]'], [[(True, b'account'), (True, b'price')]])
+        session = CountingSession({'eth_chainId': '0x1', 'eth_call': '0x' + aggregate_result.hex()})
+        with patch('utils.web3_utils._http_session', session):
+            web3 = web3_utils._create_web3('https://rpc.example.com')
+        
+        self.mock_oracle.get_cached_prices.return_value = None
+        self.mock_oracle.multicall = get_multicall_contract(web3)
+        self.mock_oracle.latest_round_calldata = [('0x5f4eC3Df9cbd43714FE2740f5E3616155c5b8419', '0xfeaf968c')]
+        self.mock_oracle.decode_latest_round_results.return_value = {'ETH/USD': 2000.0}
+        self.mock_aave_manager.user_account_data_call = ('0x87870Bca3F3fD6335C3F4ce8392D69350B4fA4E2', '0xbf92857c')
+        self.mock_aave_manager.decode_user_account_data.return_value = AT_RISK_USER_DATA
+        
+        # Take three snapshots
+        for _ in range(3):
+            self.assertEqual(self.ai_manager.snapshot(), (AT_RISK_USER_DATA, {'ETH/USD': 2000.0}))
+        
+        # Check the chain ID was fetched once and each snapshot cost one request
+        self.assertEqual(session.methods, ['eth_chainId', 'eth_call', 'eth_call', 'eth_call'])
+    
+    def test_read_streamed_json_stops_at_end_of_object(self):
+        """
+        Test that reading stops once the JSON object is closed.
+        """
+        stream = FakeStream([
+            '{"action": "none", ',
+            '"reason": "ok", "confidence": 90}',
+            ' Trailing text',
+            'never read'
+        ])
+        
+        # Read the stream
+        text = self.ai_manager._read_streamed_json(stream)
+        
+        # Check the text ends at the closing brace and the stream was closed early
+        self.assertEqual(text, '{"action": "none", "reason": "ok", "confidence": 90}')
+        self.assertEqual(stream.read, 2)
+        stream.response.close.assert_called_once()
+    
+    def test_read_streamed_json_ignores_braces_in_strings(self):
+        """
+        Test that braces inside JSON strings do not end the object.
+        """
+        stream = FakeStream([
+            '{"action": "none", "reason": "HF} is fine',
+            ' \\"really\\" {ok}", ',
+            '"confidence": 90}'
+        ])
+        
+        # Read the stream
+        text = self.ai_manager._read_streamed_json(stream)
+        
+        # Check the whole object was read
+        self.assertEqual(text, '{"action": "none", "reason": "HF} is fine \\"really\\" {ok}", "confidence": 90}')
+        self.assertEqual(stream.read, 3)
+    
+    def test_read_streamed_json_incomplete(self):
+        """
+        Test that an incomplete object returns everything received.
+        """
+        stream = FakeStream(['Here you go: {"action": ', '"none"'])
+        
+        # Read the stream
+        text = self.ai_manager._read_streamed_json(stream)
+        
+        # Check all the text was returned
+        self.assertEqual(text, 'Here you go: {"action": "none"')
+        stream.response.close.assert_called_once()
+    
+    @patch('src.ai_position_manager.OpenAI')
+    def test_get_ai_recommendation(self, mock_openai):
+        """
+        Test getting a streamed recommendation from the AI model.
+        """
+        create = mock_openai.return_value.chat.completions.create
+        create.return_value = FakeStream([
+            '{"action": "repay_debt", "asset": "USDC", "amount": 100.0, ',
+            '"reason": "Health factor too low", "confidence": 80}'
+        ])
+        
+        # Get a recommendation for a position close to the minimum health factor
+        recommendation = self.ai_manager.get_ai_recommendation(user_data=AT_RISK_USER_DATA, prices={'ETH/USD': 2000.0})
+        
+        # Check the recommendation and that the completion was streamed
+        self.assertEqual(recommendation['action'], 'repay_debt')
+        self.assertEqual(recommendation['amount'], 100.0)
+        self.assertTrue(create.call_args[1]['stream'])
+    
+    @patch('src.ai_position_manager.OPENAI_API_KEY', 'sk-test')
+    @patch('openai.resources.chat.completions.Completions.create')
+    def test_get_ai_recommendation_with_real_client(self, mock_create):
+        """
+        Test that the real OpenAI client can be built with the installed httpx.
+        """
+        mock_create.return_value = FakeStream([
+            '{"action": "repay_debt", "asset": "USDC", "amount": 100.0, "reason": "Low", "confidence": 80}'
+        ])
+        
+        # Get a recommendation, building the client on first use
+        recommendation = self.ai_manager.get_ai_recommendation(user_data=AT_RISK_USER_DATA, prices={'ETH/USD': 2000.0})
+        
+        # Check the client was built and the model answered, rather than the error fallback
+        self.assertIsInstance(self.ai_manager._openai_client, OpenAI)
+        self.assertEqual(recommendation['action'], 'repay_debt')
+        mock_create.assert_called_once()
+    
+    @patch('src.ai_position_manager.HEALTH_FACTOR_MIN', 1.5)
+    @patch('src.ai_position_manager.OpenAI')
+    def test_safe_position_skips_model(self, mock_openai):
+        """
+        Test that a comfortably safe position with stable prices gets 'none' without asking the model.
+        """
+        self.ai_manager.collect_market_data(prices={'ETH/USD': 2000.0})
+        
+        # Get a recommendation after a 1% price move
+        recommendation = self.ai_manager.get_ai_recommendation(user_data=SAFE_USER_DATA, prices={'ETH/USD': 2020.0})
+        
+        # Check no client was built
+        self.assertEqual(recommendation['action'], 'none')
+        mock_openai.assert_not_called()
+        self.assertIsNone(self.ai_manager._openai_client)
+    
+    @patch('src.ai_position_manager.HEALTH_FACTOR_MIN', 1.5)
+    @patch('src.ai_position_manager.OpenAI')
+    def test_safe_position_with_price_move_asks_model(self, mock_openai):
+        """
+        Test that a price move of 2% or more reaches the model even when the position is safe.
+        """
+        create = mock_openai.return_value.chat.completions.create
+        create.return_value = FakeStream(['{"action": "none", "reason": "Fine", "confidence": 80}'])
+        self.ai_manager.collect_market_data(prices={'ETH/USD': 2000.0})
+        
+        # Get a recommendation after a 2% price move
+        self.ai_manager.get_ai_recommendation(user_data=SAFE_USER_DATA, prices={'ETH/USD': 2040.0})
+        
+        # Check the model was asked
+        create.assert_called_once()
+    
+    @patch('src.ai_position_manager.OpenAI')
+    def test_only_none_recommendations_are_cached(self, mock_openai):
+        """
+        Test that actionable recommendations are not replayed from the cache.
+        """
+        create = mock_openai.return_value.chat.completions.create
+        create.side_effect = lambda **kwargs: FakeStream([
+            '{"action": "repay_debt", "asset": "USDC", "amount": 100.0, "reason": "Low", "confidence": 80}'
+        ])
+        
+        # Ask twice for the same state
+        prices = {'ETH/USD': 2000.0}
+        self.ai_manager.get_ai_recommendation(user_data=AT_RISK_USER_DATA, prices=prices)
+        self.ai_manager.get_ai_recommendation(user_data=AT_RISK_USER_DATA, prices=prices)
+        
+        # Check the model was asked both times
+        self.assertEqual(create.call_count, 2)
+        
+        # Ask twice for the same state when no action is needed
+        create.side_effect = lambda **kwargs: FakeStream(['{"action": "none", "reason": "Fine", "confidence": 80}'])
+        self.ai_manager.get_ai_recommendation(user_data=AT_RISK_USER_DATA, prices=prices)
+        recommendation = self.ai_manager.get_ai_recommendation(user_data=AT_RISK_USER_DATA, prices=prices)
+        
+        # Check the second answer came from the cache
+        self.assertEqual(recommendation['action'], 'none')
+        self.assertEqual(create.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
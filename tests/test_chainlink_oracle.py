@@ -1,12 +1,15 @@
 import sys
 import os
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import requests
+from eth_abi import encode
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.chainlink_oracle import ChainlinkOracle
+from src.chainlink_oracle import ChainlinkOracle, LATEST_ROUND_DATA_TYPES
 
 class TestChainlinkOracle(unittest.TestCase):
     """
@@ -26,47 +29,227 @@ class TestChainlinkOracle(unittest.TestCase):
         self.mock_contract = MagicMock()
         self.mock_web3.eth.contract.return_value = self.mock_contract
         
+        # Mock the decimals() call made when the oracle is created
+        self.mock_web3.eth.call.return_value = encode(['uint8'], [8])
+        
         # Create the oracle
         self.oracle = ChainlinkOracle()
+        self.mock_web3.eth.call.reset_mock()
     
     def test_get_latest_price(self):
         """
         Test getting the latest price.
         """
-        # Mock the latestRoundData function
-        mock_function = MagicMock()
-        self.mock_contract.functions.latestRoundData = mock_function
-        mock_function.return_value.call.return_value = [1, 200000000000, 1000000000, 1000000000, 1]
+        # Mock the latestRoundData call
+        self.mock_web3.eth.call.return_value = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
         
         # Get the latest price
         price = self.oracle.get_latest_price('ETH/USD')
         
         # Check the price
         self.assertEqual(price, 2000.0)
+        
+        # Check the pre-encoded latestRoundData() selector was sent
+        self.assertEqual(self.mock_web3.eth.call.call_args[0][0]['data'], '0xfeaf968c')
+    
+    def test_get_latest_price_raw(self):
+        """
+        Test getting the latest raw answer without scaling.
+        """
+        # Mock the latestRoundData call
+        self.mock_web3.eth.call.return_value = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+        
+        # Get the raw answer
+        answer = self.oracle.get_latest_price_raw('ETH/USD')
+        
+        # Check the answer is the unscaled integer
+        self.assertEqual(answer, 200000000000)
+        self.assertIsInstance(answer, int)
+        self.assertEqual(self.oracle.decimals['ETH/USD'], 8)
+    
+    def test_get_latest_price_cached(self):
+        """
+        Test that a recent price is reused until it is invalidated.
+        """
+        # Mock the latestRoundData call
+        self.mock_web3.eth.call.return_value = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+        
+        # Read the price twice
+        self.assertEqual(self.oracle.get_latest_price('ETH/USD'), 2000.0)
+        self.assertEqual(self.oracle.get_latest_price('ETH/USD'), 2000.0)
+        self.assertEqual(self.mock_web3.eth.call.call_count, 1)
+        
+        # Read the price again after invalidating it
+        self.oracle.invalidate('ETH/USD')
+        self.assertEqual(self.oracle.get_latest_price('ETH/USD'), 2000.0)
+        self.assertEqual(self.mock_web3.eth.call.call_count, 2)
     
     def test_get_all_prices(self):
         """
         Test getting all prices.
         """
-        # Mock the latestRoundData function
+        # Mock the Multicall3 aggregate3 function
+        return_data = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+        mock_function = MagicMock()
+        self.mock_contract.functions.aggregate3 = mock_function
+        mock_function.return_value.call.return_value = [(True, return_data)]
+        
+        # Get all prices
+        prices = self.oracle.get_all_prices()
+        
+        # Check the prices
+        self.assertEqual(prices, {'ETH/USD': 2000.0})
+        mock_function.assert_called_once()
+    
+    def test_get_all_prices_skips_failed_feeds(self):
+        """
+        Test that feeds whose call fails inside the multicall are skipped.
+        """
         mock_function = MagicMock()
-        self.mock_contract.functions.latestRoundData = mock_function
-        mock_function.return_value.call.return_value = [1, 200000000000, 1000000000, 1000000000, 1]
+        self.mock_contract.functions.aggregate3 = mock_function
+        mock_function.return_value.call.return_value = [(False, b'')]
+        
+        # Get all prices
+        prices = self.oracle.get_all_prices()
+        
+        # Check the prices
+        self.assertEqual(prices, {})
+    
+    @patch('src.chainlink_oracle.batch_eth_call')
+    def test_get_all_prices_multicall_fallback(self, mock_batch_eth_call):
+        """
+        Test that the JSON-RPC batch serves the prices when the multicall fails.
+        """
+        self.mock_contract.functions.aggregate3.return_value.call.side_effect = Exception("execution reverted")
+        
+        # Mock the batched latestRoundData call
+        return_data = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+        mock_batch_eth_call.return_value = [(True, return_data)]
         
         # Get all prices
         prices = self.oracle.get_all_prices()
         
         # Check the prices
         self.assertEqual(prices, {'ETH/USD': 2000.0})
+        self.assertEqual(mock_batch_eth_call.call_args[0][0][0][1], '0xfeaf968c')
+        self.mock_web3.eth.call.assert_not_called()
+    
+    @patch('src.chainlink_oracle.batch_eth_call')
+    @patch('src.chainlink_oracle.aggregate3')
+    def test_get_all_prices_multicall_error_uses_batch(self, mock_aggregate3, mock_batch_eth_call):
+        """
+        Test that the JSON-RPC batch serves the prices when aggregate3 raises a provider error.
+        """
+        mock_aggregate3.side_effect = requests.exceptions.HTTPError("503 Server Error: Service Unavailable")
+        
+        # Mock the batched latestRoundData call
+        return_data = encode(LATEST_ROUND_DATA_TYPES, [1, 210000000000, 1000000000, 1000000000, 1])
+        mock_batch_eth_call.return_value = [(True, return_data)]
+        
+        # Get all prices
+        prices = self.oracle.get_all_prices()
+        
+        # Check the batch was used for every feed and no feed was read on its own
+        self.assertEqual(prices, {'ETH/USD': 2100.0})
+        mock_aggregate3.assert_called_once()
+        mock_batch_eth_call.assert_called_once_with(self.oracle.latest_round_calldata)
+        self.mock_web3.eth.call.assert_not_called()
+    
+    @patch('src.chainlink_oracle.batch_eth_call')
+    def test_get_all_prices_batch_fallback(self, mock_batch_eth_call):
+        """
+        Test falling back to individual calls when the multicall and the batch fail.
+        """
+        self.mock_contract.functions.aggregate3.return_value.call.side_effect = Exception("execution reverted")
+        mock_batch_eth_call.side_effect = ValueError("batch requests not supported")
+        
+        # Mock the latestRoundData call
+        self.mock_web3.eth.call.return_value = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+        
+        # Get all prices
+        prices = self.oracle.get_all_prices()
+        
+        # Check the prices were read with an individual call after the batch failed
+        self.assertEqual(prices, {'ETH/USD': 2000.0})
+        mock_batch_eth_call.assert_called_once()
+        self.mock_web3.eth.call.assert_called_once()
+    
+    def test_handle_answer_updated(self):
+        """
+        Test that an AnswerUpdated log updates the cached price.
+        """
+        aggregator = '0x37bc7498f4ff12c19678ee8fe19d713b87f6a9e6'
+        log = {
+            'address': aggregator,
+            'topics': [
+                '0x0559884fd3a460db3073b7fc896cc77986f16e378210ded43186175bf646fc5f',
+                '0x' + encode(['int256'], [210000000000]).hex(),
+                '0x' + encode(['uint256'], [42]).hex()
+            ],
+            'data': '0x' + encode(['uint256'], [1234567890]).hex(),
+            'removed': False
+        }
+        
+        # Handle the log
+        update = self.oracle._handle_answer_updated(log, {aggregator: 'ETH/USD'})
+        
+        # Check the update and that the price is now served from the cache
+        self.assertEqual(update, ('ETH/USD', 2100.0, 1234567890))
+        self.assertEqual(self.oracle.get_latest_price('ETH/USD'), 2100.0)
+        self.mock_web3.eth.call.assert_not_called()
+    
+    def test_subscribed_prices_expire(self):
+        """
+        Test that prices kept current by a subscription expire after subscription_max_age.
+        """
+        self.oracle._subscribed_pairs.add('ETH/USD')
+        
+        with patch('src.chainlink_oracle.time.monotonic') as mock_monotonic:
+            mock_monotonic.return_value = 1000.0
+            self.oracle._price_cache['ETH/USD'] = (1000.0, 210000000000)
+            
+            # Check the price is served from the cache past cache_ttl
+            mock_monotonic.return_value = 1000.0 + 60
+            self.assertEqual(self.oracle.get_cached_prices(), {'ETH/USD': 2100.0})
+            
+            # Check the price is fetched again once it is older than subscription_max_age
+            mock_monotonic.return_value = 1000.0 + self.oracle.subscription_max_age
+            self.assertIsNone(self.oracle.get_cached_prices())
+            self.mock_web3.eth.call.return_value = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+            self.assertEqual(self.oracle.get_latest_price('ETH/USD'), 2000.0)
+            self.mock_web3.eth.call.assert_called_once()
+    
+    def test_get_cached_prices_missing(self):
+        """
+        Test that cached prices are only returned when every pair is cached.
+        """
+        self.assertIsNone(self.oracle.get_cached_prices())
+        
+        self.oracle._price_cache['ETH/USD'] = (1e12, 200000000000)
+        self.assertEqual(self.oracle.get_cached_prices(), {'ETH/USD': 2000.0})
+    
+    @patch('src.chainlink_oracle.get_async_web3_connection')
+    def test_get_all_prices_async(self, mock_get_async_web3_connection):
+        """
+        Test getting all prices concurrently.
+        """
+        # Mock the async latestRoundData call
+        mock_get_async_web3_connection.return_value.eth.call = AsyncMock(
+            return_value=encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1000000000, 1])
+        )
+        
+        # Get all prices
+        prices = asyncio.run(self.oracle.get_all_prices_async())
+        
+        # Check the prices
+        self.assertEqual(prices, {'ETH/USD': 2000.0})
     
     def test_get_price_feed_update_time(self):
         """
         Test getting the price feed update time.
         """
-        # Mock the latestRoundData function
-        mock_function = MagicMock()
-        self.mock_contract.functions.latestRoundData = mock_function
-        mock_function.return_value.call.return_value = [1, 200000000000, 1000000000, 1234567890, 1]
+        # Mock the latestRoundData call
+        self.mock_web3.eth.call.return_value = encode(LATEST_ROUND_DATA_TYPES, [1, 200000000000, 1000000000, 1234567890, 1])
         
         # Get the update time
         update_time = self.oracle.get_price_feed_update_time('ETH/USD')
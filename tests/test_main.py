@@ -0,0 +1,227 @@
+import sys
+import os
+import asyncio
+import logging
+import queue
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock, AsyncMock
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.main import DroppingQueueHandler, MonitorState, get_poll_interval, health_watcher, price_poller, price_subscriber
+
+TX_HASH = '0x' + '11' * 32
+
+def make_record(level, message):
+    """
+    Build a log record with the given level and message.
+    """
+    return logging.LogRecord('position_manager', level, __file__, 0, message, None, None)
+
+class TestDroppingQueueHandler(unittest.TestCase):
+    """
+    Test cases for the DroppingQueueHandler class.
+    """
+    
+    def setUp(self):
+        """
+        Set up a handler whose queue is already full.
+        """
+        self.log_queue = queue.Queue(2)
+        self.handler = DroppingQueueHandler(self.log_queue)
+        self.handler.enqueue(make_record(logging.INFO, 'first'))
+        self.handler.enqueue(make_record(logging.INFO, 'second'))
+    
+    def queued_messages(self):
+        """
+        Drain the queue and return the queued messages.
+        """
+        messages = []
+        while not self.log_queue.empty():
+            messages.append(self.log_queue.get_nowait().msg)
+        return messages
+    
+    def test_drops_low_level_records_when_full(self):
+        """
+        Test that records below WARNING are dropped when the queue is full.
+        """
+        self.handler.enqueue(make_record(logging.INFO, 'dropped'))
+        
+        self.assertEqual(self.queued_messages(), ['first', 'second'])
+    
+    @patch('src.main.LOG_ENQUEUE_TIMEOUT', 0.01)
+    def test_keeps_errors_when_full(self):
+        """
+        Test that an error replaces the oldest record when the queue stays full.
+        """
+        self.handler.enqueue(make_record(logging.ERROR, 'kept'))
+        
+        self.assertEqual(self.queued_messages(), ['second', 'kept'])
+
+class TestGetPollInterval(unittest.TestCase):
+    """
+    Test cases for the adaptive poll interval.
+    """
+    
+    @patch('src.main.HEALTH_FACTOR_MIN', 1.5)
+    def test_get_poll_interval(self):
+        """
+        Test the interval for health factors and volatilities across the range.
+        """
+        # (health_factor, volatility, expected interval) with interval=300 and min_interval=10
+        cases = [
+            (3.0, {}, 300),                                   # Margin of 1 at unit volatility gives the max interval
+            (10.0, {'ETH/USD': 0.5}, 300),                    # Far above the minimum, clamped at the max
+            (3.0, {'ETH/USD': 0.0}, 300),                     # Zero volatility does not divide by zero
+            (1.65, {}, 30),                                   # Proportional to the margin in between
+            (3.0, {'ETH/USD': 4.0, 'BTC/USD': 1.0}, 75),      # Shrinks with the highest volatility
+            (1.53, {}, 10),                                   # Near the minimum, clamped at min_interval
+            (1.5, {}, 10),                                    # At the minimum
+            (1.2, {'ETH/USD': 2.0}, 10),                      # Below the minimum, clamped at min_interval
+        ]
+        
+        for health_factor, volatility, expected in cases:
+            with self.subTest(health_factor=health_factor, volatility=volatility):
+                self.assertAlmostEqual(get_poll_interval(health_factor, volatility, 300, 10), expected)
+
+class TestHealthWatcher(unittest.TestCase):
+    """
+    Test cases for the health watcher task.
+    """
+    
+    def setUp(self):
+        """
+        Set up the test environment.
+        """
+        self.args = SimpleNamespace(interval=300, min_interval=0.01, dry_run=False)
+        
+        # A position below the minimum health factor, so the watcher runs every min_interval
+        self.aave_manager = MagicMock()
+        self.aave_manager.get_health_factor.return_value = 1.2
+        
+        self.ai_manager = MagicMock()
+        self.ai_manager.get_ai_recommendation.return_value = {
+            'action': 'repay_debt',
+            'asset': 'USDC',
+            'amount': 100.0,
+            'reason': 'Health factor too low',
+            'confidence': 80
+        }
+        self.ai_manager.execute_recommendation.return_value = True
+        self.ai_manager.last_tx_hash = TX_HASH
+        self.ai_manager.calculate_volatility.return_value = {}
+        self.ai_manager.snapshot_async = AsyncMock(return_value=({'health_factor': 2 * 10**18}, {}))
+    
+    def run_watcher(self, duration=0.1):
+        """
+        Run the health watcher for a while, then cancel it.
+        """
+        async def run():
+            state = MonitorState()
+            state.user_data, state.prices = {'health_factor': 12 * 10**17}, {}
+            state.ready.set()
+            
+            task = asyncio.create_task(health_watcher(self.args, self.aave_manager, self.ai_manager, state))
+            await asyncio.sleep(duration)
+            task.cancel()
+            
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            
+            return state
+        
+        return asyncio.run(run())
+    
+    def test_does_not_execute_while_transaction_pending(self):
+        """
+        Test that no new transaction is sent while the last one is being mined.
+        """
+        self.aave_manager.is_transaction_mined.return_value = False
+        
+        # Run the watcher for several intervals
+        state = self.run_watcher()
+        
+        # Check the recommendation was executed only once and the receipt was polled
+        self.ai_manager.execute_recommendation.assert_called_once()
+        self.assertGreater(self.aave_manager.is_transaction_mined.call_count, 1)
+        self.aave_manager.is_transaction_mined.assert_called_with(TX_HASH)
+        self.assertEqual(state.pending_tx[0], TX_HASH)
+    
+    def test_refreshes_snapshot_once_transaction_mined(self):
+        """
+        Test that the snapshot is refreshed before acting again once the transaction is mined.
+        """
+        self.aave_manager.is_transaction_mined.return_value = True
+        
+        # Run the watcher for several intervals
+        self.run_watcher()
+        
+        # Check the recommendation was executed again, after a fresh snapshot
+        self.assertGreater(self.ai_manager.execute_recommendation.call_count, 1)
+        self.ai_manager.snapshot_async.assert_awaited()
+        self.assertEqual(
+            self.ai_manager.get_ai_recommendation.call_args[1]['user_data'],
+            {'health_factor': 2 * 10**18}
+        )
+
+class TestPricePoller(unittest.TestCase):
+    """
+    Test cases for the price poller task.
+    """
+    
+    def test_records_snapshots_in_history(self):
+        """
+        Test that every snapshot is recorded, so volatility uses prices at the polling rate.
+        """
+        args = SimpleNamespace(price_interval=0.01, min_interval=0.01)
+        aave_manager = MagicMock()
+        aave_manager.get_health_factor.return_value = 2.0
+        aave_manager.is_position_safe.return_value = True
+        ai_manager = MagicMock()
+        ai_manager.calculate_volatility.return_value = {}
+        user_data, prices = {'health_factor': 2 * 10**18}, {'ETH/USD': 2000.0}
+        ai_manager.snapshot_async = AsyncMock(return_value=(user_data, prices))
+        
+        async def run():
+            task = asyncio.create_task(price_poller(args, aave_manager, ai_manager, MonitorState()))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        
+        # Run the poller for several intervals
+        asyncio.run(run())
+        
+        # Check every snapshot was appended to the history
+        self.assertEqual(ai_manager.collect_market_data.call_count, ai_manager.snapshot_async.await_count)
+        ai_manager.collect_market_data.assert_called_with(prices=prices)
+        ai_manager.collect_position_data.assert_called_with(user_data=user_data)
+
+class TestPriceSubscriber(unittest.TestCase):
+    """
+    Test cases for the price subscriber task.
+    """
+    
+    @patch('src.main.SUBSCRIPTION_RETRY_DELAY', 0)
+    def test_subscribes_again_after_errors(self):
+        """
+        Test that the subscription is renewed after it fails or returns.
+        """
+        chainlink_oracle = MagicMock()
+        chainlink_oracle.subscribe = AsyncMock(side_effect=[ConnectionError("closed"), None, asyncio.CancelledError()])
+        
+        # Run the subscriber until it is cancelled
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(price_subscriber(chainlink_oracle))
+        
+        self.assertEqual(chainlink_oracle.subscribe.await_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
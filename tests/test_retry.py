@@ -0,0 +1,158 @@
+import sys
+import os
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import httpx
+import requests
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.retry import retryable, CircuitBreaker
+
+class TestRetryable(unittest.TestCase):
+    """
+    Test cases for the retryable decorator.
+    """
+    
+    @patch('utils.retry.time.sleep')
+    def test_retries_until_success(self, mock_sleep):
+        """
+        Test that a transient error is retried until the call succeeds.
+        """
+        function = MagicMock(side_effect=[requests.exceptions.ConnectionError("refused"), 42])
+        function.__name__ = 'read'
+        
+        self.assertEqual(retryable()(function)(), 42)
+        self.assertEqual(function.call_count, 2)
+        mock_sleep.assert_called_once()
+    
+    @patch('utils.retry.time.sleep')
+    def test_gives_up_after_max_attempts(self, mock_sleep):
+        """
+        Test that the last error is raised after max_attempts calls.
+        """
+        function = MagicMock(side_effect=requests.exceptions.Timeout("timed out"))
+        function.__name__ = 'read'
+        
+        with self.assertRaises(requests.exceptions.Timeout):
+            retryable(max_attempts=4)(function)()
+        
+        # Check there is no wait after the last attempt
+        self.assertEqual(function.call_count, 4)
+        self.assertEqual(mock_sleep.call_count, 3)
+    
+    @patch('utils.retry.random.uniform', return_value=0.0)
+    @patch('utils.retry.time.sleep')
+    def test_backoff_is_capped(self, mock_sleep, mock_uniform):
+        """
+        Test that the backoff doubles on each retry up to the cap.
+        """
+        function = MagicMock(side_effect=requests.exceptions.HTTPError("503"))
+        function.__name__ = 'read'
+        
+        with self.assertRaises(requests.exceptions.HTTPError):
+            retryable(max_attempts=6, base=0.1, cap=0.5)(function)()
+        
+        delays = [call[0][0] for call in mock_sleep.call_args_list]
+        self.assertEqual(delays, [0.1, 0.2, 0.4, 0.5, 0.5])
+    
+    @patch('utils.retry.time.sleep')
+    def test_retries_httpx_errors(self, mock_sleep):
+        """
+        Test that errors of the HTTP/2 provider are retried too.
+        """
+        function = MagicMock(side_effect=[httpx.ConnectError("refused"), 42])
+        function.__name__ = 'read'
+        
+        self.assertEqual(retryable()(function)(), 42)
+    
+    @patch('utils.retry.asyncio.sleep', new_callable=AsyncMock)
+    @patch('utils.retry.time.sleep')
+    def test_retries_coroutines(self, mock_sleep, mock_async_sleep):
+        """
+        Test that coroutine functions are retried without blocking the event loop.
+        """
+        calls = []
+        
+        @retryable()
+        async def read():
+            calls.append(None)
+            if len(calls) == 1:
+                raise asyncio.TimeoutError()
+            return 42
+        
+        self.assertEqual(asyncio.run(read()), 42)
+        self.assertEqual(len(calls), 2)
+        mock_async_sleep.assert_awaited_once()
+        mock_sleep.assert_not_called()
+    
+    @patch('utils.retry.time.sleep')
+    def test_non_transient_errors_pass_through(self, mock_sleep):
+        """
+        Test that errors that are not transient are raised immediately.
+        """
+        function = MagicMock(side_effect=ValueError("execution reverted"))
+        function.__name__ = 'read'
+        
+        with self.assertRaises(ValueError):
+            retryable()(function)()
+        
+        self.assertEqual(function.call_count, 1)
+        mock_sleep.assert_not_called()
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Test cases for the CircuitBreaker class.
+    """
+    
+    @patch('utils.retry.time.monotonic', return_value=100.0)
+    def test_opens_at_threshold(self, mock_monotonic):
+        """
+        Test that the breaker opens after failure_threshold consecutive failures.
+        """
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=5.0)
+        
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open())
+        
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+    
+    @patch('utils.retry.time.monotonic', return_value=100.0)
+    def test_success_resets_failures(self, mock_monotonic):
+        """
+        Test that a success in between resets the failure count.
+        """
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=5.0)
+        
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open())
+    
+    @patch('utils.retry.time.monotonic')
+    def test_closes_after_cooldown(self, mock_monotonic):
+        """
+        Test that the breaker lets calls through again after the cooldown.
+        """
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=5.0)
+        
+        mock_monotonic.return_value = 100.0
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+        
+        mock_monotonic.return_value = 104.9
+        self.assertTrue(breaker.is_open())
+        
+        mock_monotonic.return_value = 105.0
+        self.assertFalse(breaker.is_open())
+        
+        # The next failure reopens it
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+
+if __name__ == '__main__':
+    unittest.main()
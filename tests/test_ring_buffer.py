@@ -0,0 +1,73 @@
+import sys
+import os
+import unittest
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.ring_buffer import RingBuffer
+
+class TestRingBuffer(unittest.TestCase):
+    """
+    Test cases for the RingBuffer class.
+    """
+    
+    def setUp(self):
+        """
+        Set up the test environment.
+        """
+        self.buffer = RingBuffer(3, timestamp=np.int64, price=np.float64)
+    
+    def test_append(self):
+        """
+        Test appending entries to a buffer that is not full.
+        """
+        self.buffer.append(timestamp=1, price=10.0)
+        self.buffer.append(timestamp=2, price=20.0)
+        
+        # Check the entries are returned oldest first
+        self.assertEqual(len(self.buffer), 2)
+        self.assertEqual(self.buffer.tail('price').tolist(), [10.0, 20.0])
+        self.assertEqual(self.buffer.tail('timestamp').tolist(), [1, 2])
+    
+    def test_wrap_around(self):
+        """
+        Test that the oldest entries are overwritten once the buffer is full.
+        """
+        for i in range(1, 6):
+            self.buffer.append(timestamp=i, price=i * 10.0)
+        
+        # Check only the last three entries are kept, still oldest first
+        self.assertEqual(len(self.buffer), 3)
+        self.assertEqual(self.buffer.tail('price').tolist(), [30.0, 40.0, 50.0])
+        self.assertEqual(self.buffer.tail('price', 2).tolist(), [40.0, 50.0])
+    
+    def test_tail_count_larger_than_size(self):
+        """
+        Test that asking for more entries than stored returns all of them.
+        """
+        self.buffer.append(timestamp=1, price=10.0)
+        self.buffer.append(timestamp=2, price=20.0)
+        
+        # Check the tail is capped at the number of entries
+        self.assertEqual(self.buffer.tail('price', 10).tolist(), [10.0, 20.0])
+        self.assertEqual(len(RingBuffer(3, price=np.float64).tail('price', 2)), 0)
+    
+    def test_tail_is_read_only_view(self):
+        """
+        Test that the tail is a read-only view that does not block appends.
+        """
+        self.buffer.append(timestamp=1, price=10.0)
+        view = self.buffer.tail('price')
+        
+        # Check the view cannot be written to
+        with self.assertRaises(ValueError):
+            view[0] = 0.0
+        
+        # Check the buffer can still be appended to
+        self.buffer.append(timestamp=2, price=20.0)
+        self.assertEqual(self.buffer.tail('price').tolist(), [10.0, 20.0])
+
+if __name__ == '__main__':
+    unittest.main()
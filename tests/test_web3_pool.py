@@ -0,0 +1,207 @@
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+import requests
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.web3_pool import Web3Pool
+
+URLS = ['https://a.example.com', 'https://b.example.com', 'https://c.example.com']
+
+class FakeWeb3Factory:
+    """
+    Fake create_web3 that returns one mock Web3 per URL and records the injected middleware.
+    """
+    
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.created = []
+        self.web3s = {}
+    
+    def __call__(self, url):
+        time.sleep(self.delay)
+        self.created.append(url)
+        
+        web3 = MagicMock()
+        web3.is_connected.return_value = True
+        self.web3s[url] = web3
+        return web3
+    
+    def failover(self, url, make_request):
+        """
+        Build the failover middleware injected into the Web3 for a URL around make_request.
+        """
+        middleware = self.web3s[url].middleware_onion.inject.call_args[0][0]
+        return middleware(make_request, self.web3s[url])
+
+class TestWeb3Pool(unittest.TestCase):
+    """
+    Test cases for the Web3Pool class.
+    """
+    
+    def setUp(self):
+        """
+        Set up the test environment.
+        """
+        self.factory = FakeWeb3Factory()
+        self.pool = Web3Pool(URLS, self.factory, failure_threshold=2, cooldown=60)
+    
+    def test_requires_provider(self):
+        """
+        Test that a pool needs at least one provider.
+        """
+        with self.assertRaises(ValueError):
+            Web3Pool([], self.factory)
+    
+    def test_round_robin(self):
+        """
+        Test that providers are picked in turn.
+        """
+        picked = [self.pool.pick_healthy() for _ in range(4)]
+        self.assertEqual(picked, URLS + URLS[:1])
+    
+    def test_skips_open_breaker(self):
+        """
+        Test that a provider is skipped once its breaker opens, and used again after a success.
+        """
+        # One failure is below the threshold
+        self.pool.mark_failed(URLS[1])
+        self.assertEqual([self.pool.pick_healthy() for _ in range(3)], URLS)
+        
+        # The second failure opens the breaker
+        self.pool.mark_failed(URLS[1])
+        self.assertEqual([self.pool.pick_healthy() for _ in range(4)], [URLS[0], URLS[2], URLS[0], URLS[2]])
+        
+        self.pool.mark_succeeded(URLS[1])
+        self.assertIn(URLS[1], [self.pool.pick_healthy() for _ in range(3)])
+    
+    def test_all_open_falls_back(self):
+        """
+        Test that a provider is still picked when every breaker is open.
+        """
+        for url in URLS:
+            self.pool.mark_failed(url)
+            self.pool.mark_failed(url)
+        
+        self.assertIn(self.pool.pick_healthy(), URLS)
+        self.assertIsNone(self.pool.pick_healthy(exclude=URLS))
+    
+    def test_get_caches_instances(self):
+        """
+        Test that each provider's Web3 is created once and reused.
+        """
+        first = [self.pool.get() for _ in URLS]
+        second = [self.pool.get() for _ in URLS]
+        
+        self.assertEqual(self.factory.created, URLS)
+        self.assertEqual([id(web3) for web3 in first], [id(web3) for web3 in second])
+    
+    def test_get_skips_unreachable_provider(self):
+        """
+        Test that a provider that fails the connection check is skipped.
+        """
+        def create_web3(url):
+            web3 = self.factory(url)
+            web3.is_connected.return_value = url != URLS[0]
+            return web3
+        
+        pool = Web3Pool(URLS, create_web3)
+        
+        self.assertIs(pool.get(), self.factory.web3s[URLS[1]])
+    
+    def test_concurrent_first_use_creates_once(self):
+        """
+        Test that concurrent first uses of a provider create a single Web3.
+        """
+        factory = FakeWeb3Factory(delay=0.05)
+        pool = Web3Pool(URLS[:1], factory)
+        
+        # Get the same provider from several threads at once
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool._get_web3(URLS[0]))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Check the instance was created and injected once, and shared
+        self.assertEqual(factory.created, URLS[:1])
+        self.assertEqual(len({id(web3) for web3 in results}), 1)
+        factory.web3s[URLS[0]].middleware_onion.inject.assert_called_once()
+    
+    def test_failover_middleware_retries_on_other_provider(self):
+        """
+        Test that a request failing with a provider error is retried on another provider.
+        """
+        self.pool._get_web3(URLS[0])
+        make_request = MagicMock(side_effect=requests.exceptions.ConnectionError("refused"))
+        failover = self.factory.failover(URLS[0], make_request)
+        
+        response = failover('eth_blockNumber', [])
+        
+        # Check the next provider answered and the failure was recorded
+        fallback = self.factory.web3s[URLS[1]]
+        self.assertIs(response, fallback.provider.make_request.return_value)
+        fallback.provider.make_request.assert_called_once_with('eth_blockNumber', [])
+        self.assertEqual(self.pool._breakers[URLS[0]]._failures, 1)
+    
+    def test_failover_middleware_raises_when_all_fail(self):
+        """
+        Test that the last error is raised when every provider fails.
+        """
+        self.pool._get_web3(URLS[0])
+        make_request = MagicMock(side_effect=requests.exceptions.ConnectionError("refused"))
+        failover = self.factory.failover(URLS[0], make_request)
+        
+        for url in URLS[1:]:
+            self.pool._get_web3(url).provider.make_request.side_effect = requests.exceptions.Timeout("timed out")
+        
+        with self.assertRaises(requests.exceptions.Timeout):
+            failover('eth_blockNumber', [])
+    
+    def test_failover_middleware_passes_rpc_errors(self):
+        """
+        Test that errors other than provider errors are not retried elsewhere.
+        """
+        self.pool._get_web3(URLS[0])
+        make_request = MagicMock(side_effect=ValueError("execution reverted"))
+        failover = self.factory.failover(URLS[0], make_request)
+        
+        with self.assertRaises(ValueError):
+            failover('eth_call', [])
+        
+        self.assertEqual(self.factory.created, URLS[:1])
+    
+    def test_broadcast_returns_first_acknowledgement(self):
+        """
+        Test that a broadcast succeeds if any provider accepts the transaction.
+        """
+        for url in URLS:
+            web3 = self.pool._get_web3(url)
+            web3.eth.send_raw_transaction.side_effect = ValueError("already known")
+        self.factory.web3s[URLS[2]].eth.send_raw_transaction.side_effect = None
+        self.factory.web3s[URLS[2]].eth.send_raw_transaction.return_value = b'\x11' * 32
+        
+        tx_hash = self.pool.broadcast_raw_transaction(b'signed')
+        
+        # Check the accepted hash was returned
+        self.assertEqual(tx_hash, b'\x11' * 32)
+        self.factory.web3s[URLS[2]].eth.send_raw_transaction.assert_called_once_with(b'signed')
+    
+    def test_broadcast_raises_when_all_reject(self):
+        """
+        Test that a broadcast fails if every provider rejects the transaction.
+        """
+        for url in URLS:
+            self.pool._get_web3(url).eth.send_raw_transaction.side_effect = ValueError("nonce too low")
+        
+        with self.assertRaises(ValueError):
+            self.pool.broadcast_raw_transaction(b'signed')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import sys
+import os
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+import requests
+from hexbytes import HexBytes
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import web3_utils
+from utils.web3_utils import HTTP_POOL_SIZE, RPC_TIMEOUT
+
+SIGNED_TX = SimpleNamespace(rawTransaction=b'signed', hash=HexBytes(b'\x22' * 32))
+
+class TestWeb3Utils(unittest.TestCase):
+    """
+    Test cases for the web3 utilities.
+    """
+    
+    def test_http_session_pool_size(self):
+        """
+        Test that the shared session keeps enough connections for the worker threads.
+        """
+        adapter = web3_utils._http_session.get_adapter('https://rpc.example.com')
+        self.assertEqual(adapter._pool_maxsize, HTTP_POOL_SIZE)
+    
+    @patch('utils.web3_utils.RPC_HTTP2', False)
+    def test_provider_uses_shared_session_from_other_threads(self):
+        """
+        Test that requests made from a thread other than the creating one use the shared session.
+        """
+        mock_session = MagicMock()
+        mock_session.post.return_value.content = b'{"jsonrpc": "2.0", "id": 0, "result": "0x10"}'
+        
+        with patch('utils.web3_utils._http_session', mock_session):
+            web3 = web3_utils._create_web3('https://rpc.example.com')
+        
+        # Make a request from a worker thread
+        results = []
+        thread = threading.Thread(target=lambda: results.append(web3.provider.make_request('eth_blockNumber', [])))
+        thread.start()
+        thread.join()
+        
+        # Check the request was posted through the shared session
+        self.assertEqual(results[0]['result'], '0x10')
+        mock_session.post.assert_called_once()
+        self.assertEqual(mock_session.post.call_args[0][0], 'https://rpc.example.com')
+        self.assertEqual(mock_session.post.call_args[1]['timeout'], RPC_TIMEOUT)
+    
+    @patch('utils.web3_utils.RPC_HTTP2', False)
+    def test_provider_does_not_retry(self):
+        """
+        Test that neither the provider nor the session retries requests on their own.
+        """
+        web3 = web3_utils._create_web3('https://rpc.example.com')
+        
+        self.assertEqual(tuple(web3.provider.middlewares), ())
+        self.assertEqual(web3_utils._http_session.get_adapter('https://rpc.example.com').max_retries.total, 0)
+    
+    @patch('utils.retry.time.sleep')
+    @patch('utils.web3_utils.PROVIDER_URLS', ['https://rpc.example.com'])
+    @patch('utils.web3_utils.get_web3_connection')
+    @patch('utils.web3_utils.get_account')
+    def test_send_retry_after_timeout_returns_hash(self, mock_get_account, mock_get_web3_connection, mock_sleep):
+        """
+        Test that a retried send rejected as already known returns the hash of the sent transaction.
+        """
+        mock_get_account.return_value.sign_transaction.return_value = SIGNED_TX
+        send_raw_transaction = mock_get_web3_connection.return_value.eth.send_raw_transaction
+        send_raw_transaction.side_effect = [
+            requests.exceptions.ReadTimeout("read timed out"),
+            ValueError({'code': -32000, 'message': 'already known'})
+        ]
+        
+        # Send a transaction whose first response times out
+        tx_hash = web3_utils.sign_and_send_transaction({'nonce': 7})
+        
+        # Check the same signed transaction was sent twice and reported as sent
+        self.assertEqual(tx_hash, '0x' + '22' * 32)
+        self.assertEqual(send_raw_transaction.call_count, 2)
+        send_raw_transaction.assert_called_with(b'signed')
+        mock_get_account.return_value.sign_transaction.assert_called_once()
+    
+    @patch('utils.web3_utils.PROVIDER_URLS', ['https://rpc.example.com'])
+    @patch('utils.web3_utils.get_web3_connection')
+    @patch('utils.web3_utils.get_account')
+    def test_send_rejected_on_first_attempt_raises(self, mock_get_account, mock_get_web3_connection):
+        """
+        Test that a too low nonce on the first attempt is still reported as a failure.
+        """
+        mock_get_account.return_value.sign_transaction.return_value = SIGNED_TX
+        send_raw_transaction = mock_get_web3_connection.return_value.eth.send_raw_transaction
+        send_raw_transaction.side_effect = ValueError({'code': -32000, 'message': 'nonce too low'})
+        
+        with self.assertRaises(ValueError):
+            web3_utils.sign_and_send_transaction({'nonce': 7})
+
+if __name__ == '__main__':
+    unittest.main()
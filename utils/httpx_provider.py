@@ -0,0 +1,93 @@
+import threading
+import httpx
+from web3 import HTTPProvider
+from utils.rpc_codec import OrjsonCodecMixin
+
+# Connection limits of the shared HTTP/2 client. Each connection multiplexes
+# many concurrent requests, so few are needed.
+HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_httpx_client(timeout):
+    """
+    Get the process-wide HTTP/2 client, creating it on first use.
+    
+    Args:
+        timeout (float): The request timeout in seconds, used when the client is created.
+        
+    Returns:
+        httpx.Client: The shared client.
+    """
+    global _client
+    
+    with _client_lock:
+        if _client is None:
+            transport = httpx.HTTPTransport(http2=True, limits=HTTPX_LIMITS)
+            _client = httpx.Client(transport=transport, timeout=timeout)
+    
+    return _client
+
+class HTTPXProvider(OrjsonCodecMixin, HTTPProvider):
+    """
+    JSON-RPC provider that sends requests over a shared httpx HTTP/2 client.
+    
+    Concurrent requests from several threads are multiplexed as streams on
+    the same connection instead of each needing its own HTTP/1.1 connection.
+    
+    Neither the transport nor the provider retries failed requests; that is
+    left to utils.retry.retryable.
+    """
+    
+    _middlewares = ()
+    
+    def __init__(self, endpoint_uri, timeout=10):
+        """
+        Initialize the provider.
+        
+        Args:
+            endpoint_uri (str): The RPC endpoint URL.
+            timeout (float, optional): The request timeout in seconds. Defaults to 10.
+        """
+        super().__init__(endpoint_uri)
+        self.client = get_httpx_client(timeout)
+    
+    def make_request(self, method, params):
+        """
+        Send a JSON-RPC request.
+        
+        Args:
+            method (str): The JSON-RPC method.
+            params (list): The method parameters.
+            
+        Returns:
+            dict: The decoded JSON-RPC response.
+            
+        Raises:
+            httpx.HTTPError: If the request fails or returns an error status.
+        """
+        request_data = self.encode_rpc_request(method, params)
+        
+        response = self.client.post(
+            self.endpoint_uri,
+            content=request_data,
+            headers=self.get_request_headers()
+        )
+        response.raise_for_status()
+        
+        return self.decode_rpc_response(response.content)
+    
+    def is_connected(self):
+        """
+        Check whether the provider responds to requests.
+        
+        Returns:
+            bool: True if the provider is reachable, False otherwise.
+        """
+        # The base class only treats IOError as a failed connection, which
+        # httpx errors do not derive from
+        try:
+            return super().is_connected()
+        except httpx.HTTPError:
+            return False
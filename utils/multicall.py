@@ -0,0 +1,72 @@
+from web3 import Web3
+from utils.retry import retryable
+
+# Multicall3 is deployed at the same address on Ethereum, Polygon and most EVM chains
+MULTICALL3_ADDRESS = Web3.to_checksum_address("0xcA11bde05977b3631167028862bE2a173976CA11")
+
+# ABI for Multicall3 (only the functions we use)
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+def get_multicall_contract(web3):
+    """
+    Get the Multicall3 contract.
+    
+    Args:
+        web3 (Web3): The connection to use.
+        
+    Returns:
+        Contract: The Multicall3 contract.
+    """
+    return web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+
+@retryable()
+def aggregate3(multicall, calls, allow_failure=True):
+    """
+    Execute several read-only calls in a single eth_call through Multicall3.
+    
+    The calls are read-only, so the eth_call is retried on transient provider errors.
+    
+    Args:
+        multicall (Contract): The Multicall3 contract.
+        calls (list): (target address, calldata) tuples.
+        allow_failure (bool, optional): Whether a failing call is reported in
+            the results instead of reverting the whole aggregate. Defaults to True.
+        
+    Returns:
+        list: (success, return_data) tuples, in the same order as calls.
+    """
+    results = multicall.functions.aggregate3([
+        (target, allow_failure, calldata)
+        for target, calldata in calls
+    ]).call()
+    
+    return [(success, return_data) for success, return_data in results]
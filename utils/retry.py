@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import random
+import threading
+import time
+import requests
+from web3.exceptions import TimeExhausted
+
+# Errors worth retrying: the provider was unreachable, overloaded or slow,
+# as opposed to a JSON-RPC error returned for the request itself
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.HTTPError,
+    requests.exceptions.Timeout,
+    TimeExhausted
+)
+
+try:
+    import httpx
+    
+    # Raised instead by the HTTP/2 provider
+    TRANSIENT_ERRORS += (httpx.TransportError, httpx.HTTPStatusError)
+except ImportError:
+    pass
+
+try:
+    import aiohttp
+    
+    # Raised instead by the async provider
+    TRANSIENT_ERRORS += (aiohttp.ClientError, asyncio.TimeoutError)
+except ImportError:
+    pass
+
+def retryable(max_attempts=5, base=0.1, cap=2.0, jitter=0.1, retry_on=TRANSIENT_ERRORS):
+    """
+    Retry a function with exponential backoff when it raises a transient error.
+    
+    The n-th retry waits min(cap, base * 2**n) seconds plus up to jitter
+    seconds chosen at random, so concurrent callers do not retry in lockstep.
+    Coroutine functions are retried too, waiting with asyncio.sleep so the
+    event loop is not blocked.
+    
+    Args:
+        max_attempts (int, optional): The maximum number of calls. Defaults to 5.
+        base (float, optional): The first backoff in seconds. Defaults to 0.1.
+        cap (float, optional): The maximum backoff in seconds. Defaults to 2.0.
+        jitter (float, optional): The maximum random extra wait in seconds. Defaults to 0.1.
+        retry_on (tuple, optional): The exception types to retry. Defaults to TRANSIENT_ERRORS.
+    
+    Returns:
+        callable: The decorator.
+    """
+    def backoff(function, attempt, error):
+        delay = min(cap, base * 2**attempt) + random.uniform(0, jitter)
+        print(f"Error in {function.__name__}, retrying in {delay:.2f}s: {error}")
+        return delay
+    
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                for attempt in range(max_attempts):
+                    try:
+                        return await function(*args, **kwargs)
+                    except retry_on as e:
+                        if attempt == max_attempts - 1:
+                            raise
+                        
+                        await asyncio.sleep(backoff(function, attempt, e))
+            
+            return async_wrapper
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                try:
+                    return function(*args, **kwargs)
+                except retry_on as e:
+                    if attempt == max_attempts - 1:
+                        raise
+                    
+                    time.sleep(backoff(function, attempt, e))
+        
+        return wrapper
+    
+    return decorator
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures of a resource and opens after too many.
+    
+    While open, the resource should be skipped. After the cooldown the
+    breaker lets calls through again, and the next failure reopens it.
+    """
+    
+    def __init__(self, failure_threshold=3, cooldown=5.0):
+        """
+        Initialize the circuit breaker.
+        
+        Args:
+            failure_threshold (int, optional): Number of consecutive failures
+                that open the breaker. Defaults to 3.
+            cooldown (float, optional): Number of seconds for which the
+                breaker stays open. Defaults to 5.0.
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+    
+    def is_open(self):
+        """
+        Check whether the resource should currently be skipped.
+        
+        Returns:
+            bool: True while the breaker is open.
+        """
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+    
+    def record_failure(self):
+        """
+        Record a failed call, opening the breaker once the threshold is reached.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+    
+    def record_success(self):
+        """
+        Record a successful call, closing the breaker.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
@@ -0,0 +1,69 @@
+import numpy as np
+
+class RingBuffer:
+    """
+    Fixed-size columnar history buffer backed by NumPy arrays.
+    
+    Each column is a separate array (structure of arrays). Every value is
+    written twice, at index i and i + capacity, so the most recent entries
+    can always be read as a contiguous view without copying.
+    """
+    
+    def __init__(self, capacity, **columns):
+        """
+        Initialize the ring buffer.
+        
+        Args:
+            capacity (int): The maximum number of entries kept.
+            **columns: Mapping of column names to NumPy dtypes.
+        """
+        self.capacity = capacity
+        self.columns = {
+            name: np.empty(2 * capacity, dtype=dtype)
+            for name, dtype in columns.items()
+        }
+        self.head = 0
+        self.size = 0
+    
+    def __len__(self):
+        """
+        Get the number of entries currently stored.
+        
+        Returns:
+            int: The number of entries, at most capacity.
+        """
+        return self.size
+    
+    def append(self, **values):
+        """
+        Append an entry, overwriting the oldest one if the buffer is full.
+        
+        Args:
+            **values: Mapping of column names to values.
+        """
+        for name, column in self.columns.items():
+            value = values[name]
+            column[self.head] = value
+            column[self.head + self.capacity] = value
+        
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def tail(self, name, count=None):
+        """
+        Get the most recent values of a column, oldest first.
+        
+        Args:
+            name (str): The column name.
+            count (int, optional): The number of values. Defaults to all.
+        
+        Returns:
+            numpy.ndarray: A read-only view of the values.
+        """
+        if count is None or count > self.size:
+            count = self.size
+        
+        end = self.head + self.capacity
+        view = self.columns[name][end - count:end]
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,101 @@
+import orjson
+import requests
+from web3 import HTTPProvider
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+
+_web3_json_encoder = Web3JsonEncoder()
+
+class OrjsonCodecMixin:
+    """
+    Provider mixin that encodes requests and decodes responses with orjson.
+    
+    Payloads orjson cannot handle (e.g. integers wider than 64 bits) are
+    passed on to the standard web3 codec.
+    """
+    
+    def encode_rpc_request(self, method, params):
+        """
+        Encode a JSON-RPC request.
+        
+        Args:
+            method (str): The JSON-RPC method.
+            params (list): The method parameters.
+            
+        Returns:
+            bytes: The encoded request.
+        """
+        rpc_dict = {
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params or [],
+            'id': next(self.request_counter)
+        }
+        
+        try:
+            return orjson.dumps(rpc_dict, default=_web3_json_encoder.default)
+        except TypeError:
+            return FriendlyJsonSerde().json_encode(rpc_dict, Web3JsonEncoder).encode()
+    
+    def decode_rpc_response(self, raw_response):
+        """
+        Decode a JSON-RPC response.
+        
+        Args:
+            raw_response (bytes): The raw response body.
+            
+        Returns:
+            dict: The decoded response.
+        """
+        try:
+            return orjson.loads(raw_response)
+        except orjson.JSONDecodeError:
+            return super().decode_rpc_response(raw_response)
+
+class OrjsonHTTPProvider(OrjsonCodecMixin, HTTPProvider):
+    """
+    HTTPProvider that uses orjson for JSON-RPC payloads.
+    
+    Every request is posted through the session given to the provider, from
+    whichever thread makes it. HTTPProvider itself only caches that session
+    for the thread that created the provider, and gives other threads a
+    default session of their own.
+    
+    HTTPProvider's default retry middleware is dropped, so failed requests
+    are only retried in one place, by utils.retry.retryable.
+    """
+    
+    _middlewares = ()
+    
+    def __init__(self, endpoint_uri, request_kwargs=None, session=None):
+        """
+        Initialize the provider.
+        
+        Args:
+            endpoint_uri (str): The RPC endpoint URL.
+            request_kwargs (dict, optional): Extra arguments for every post, e.g. the timeout.
+            session (requests.Session, optional): The session to post through.
+                Defaults to a new session.
+        """
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self.session = session if session is not None else requests.Session()
+    
+    def make_request(self, method, params):
+        """
+        Send a JSON-RPC request.
+        
+        Args:
+            method (str): The JSON-RPC method.
+            params (list): The method parameters.
+            
+        Returns:
+            dict: The decoded JSON-RPC response.
+            
+        Raises:
+            requests.exceptions.HTTPError: If the provider returns an error status.
+        """
+        request_data = self.encode_rpc_request(method, params)
+        
+        response = self.session.post(self.endpoint_uri, data=request_data, **self.get_request_kwargs())
+        response.raise_for_status()
+        
+        return self.decode_rpc_response(response.content)
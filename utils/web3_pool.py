@@ -0,0 +1,249 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from utils.retry import CircuitBreaker
+
+# Errors that mean the provider itself is unreachable or unhealthy, as opposed
+# to a JSON-RPC error returned for a valid request
+PROVIDER_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.HTTPError,
+    requests.exceptions.Timeout
+)
+
+try:
+    import httpx
+    
+    # Raised instead by the HTTP/2 provider
+    PROVIDER_ERRORS += (httpx.TransportError, httpx.HTTPStatusError)
+except ImportError:
+    pass
+
+class Web3Pool:
+    """
+    Pool of Web3 connections to several RPC providers, used round-robin.
+    
+    Each provider has a circuit breaker: after several consecutive
+    connection or HTTP errors it is skipped for a cooldown period. Requests
+    that fail this way are retried on the other healthy providers, so
+    long-lived Web3 instances fail over as well.
+    """
+    
+    def __init__(self, provider_urls, create_web3, failure_threshold=3, cooldown=5.0):
+        """
+        Initialize the pool.
+        
+        Args:
+            provider_urls (list): The RPC endpoint URLs, in order of preference.
+            create_web3 (callable): Creates a Web3 instance for a URL.
+            failure_threshold (int, optional): Number of consecutive failures
+                after which a provider is skipped. Defaults to 3.
+            cooldown (float, optional): Number of seconds for which a failed
+                provider is skipped. Defaults to 5.0.
+        
+        Raises:
+            ValueError: If no provider URLs are given.
+        """
+        if not provider_urls:
+            raise ValueError("At least one provider URL is required")
+        
+        self.provider_urls = tuple(provider_urls)
+        self.create_web3 = create_web3
+        
+        # One cached Web3 per URL, created and checked on first use
+        self._web3s = {}
+        self._breakers = {
+            url: CircuitBreaker(failure_threshold=failure_threshold, cooldown=cooldown)
+            for url in self.provider_urls
+        }
+        self._cycle = itertools.cycle(self.provider_urls)
+        self._lock = threading.Lock()
+        
+        # Held while a Web3 instance is created, so concurrent first uses do
+        # not create and inject it twice. Re-entrant, since checking a new
+        # connection can fail over to another provider and create that one.
+        self._create_lock = threading.RLock()
+    
+    def get(self):
+        """
+        Get a connection to the next healthy provider.
+        
+        Returns:
+            Web3: A Web3 instance connected to a provider.
+        
+        Raises:
+            ConnectionError: If no provider can be connected to.
+        """
+        for _ in self.provider_urls:
+            url = self.pick_healthy()
+            
+            try:
+                return self._get_web3(url)
+            except ConnectionError as e:
+                print(f"Error connecting to provider at {url}: {e}")
+                self.mark_failed(url)
+        
+        raise ConnectionError("Failed to connect to any provider")
+    
+    def pick_healthy(self, exclude=()):
+        """
+        Pick the next provider URL in round-robin order, skipping failed ones.
+        
+        If every provider is cooling down, the next one is used anyway.
+        
+        Args:
+            exclude (tuple, optional): URLs that must not be picked.
+        
+        Returns:
+            str: The provider URL, or None if every provider is excluded.
+        """
+        candidates = [url for url in self.provider_urls if url not in exclude]
+        if not candidates:
+            return None
+        
+        with self._lock:
+            fallback = None
+            
+            for _ in self.provider_urls:
+                url = next(self._cycle)
+                if url in exclude:
+                    continue
+                
+                if not self._breakers[url].is_open():
+                    return url
+                
+                if fallback is None:
+                    fallback = url
+            
+            return fallback
+    
+    def mark_failed(self, url):
+        """
+        Record a failed request, skipping the provider once its breaker opens.
+        
+        Args:
+            url (str): The provider URL.
+        """
+        self._breakers[url].record_failure()
+    
+    def mark_succeeded(self, url):
+        """
+        Record a successful request, resetting the provider's failure count.
+        
+        Args:
+            url (str): The provider URL.
+        """
+        self._breakers[url].record_success()
+    
+    def broadcast_raw_transaction(self, raw_transaction):
+        """
+        Send a signed transaction to every provider concurrently.
+        
+        The first provider to accept it wins. The others may reject the
+        duplicate, which is expected and ignored.
+        
+        Args:
+            raw_transaction (bytes): The signed transaction.
+        
+        Returns:
+            HexBytes: The transaction hash.
+        
+        Raises:
+            Exception: The last error, if every provider rejected the transaction.
+        """
+        def send(url):
+            return self._get_web3(url).eth.send_raw_transaction(raw_transaction)
+        
+        executor = ThreadPoolExecutor(max_workers=len(self.provider_urls))
+        
+        try:
+            futures = {executor.submit(send, url): url for url in self.provider_urls}
+            
+            error = None
+            for future in as_completed(futures):
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+            
+            raise error
+        finally:
+            # Return as soon as one provider accepted, without waiting for the rest
+            executor.shutdown(wait=False)
+    
+    def _get_web3(self, url):
+        """
+        Get the cached Web3 instance for a URL, creating it if needed.
+        
+        Args:
+            url (str): The provider URL.
+        
+        Returns:
+            Web3: The Web3 instance.
+        
+        Raises:
+            ConnectionError: If the provider cannot be connected to.
+        """
+        web3 = self._web3s.get(url)
+        if web3 is not None:
+            return web3
+        
+        with self._create_lock:
+            # Another thread may have created it while this one was waiting
+            web3 = self._web3s.get(url)
+            if web3 is not None:
+                return web3
+            
+            web3 = self.create_web3(url)
+            
+            # Innermost layer, so a retried request still passes through
+            # every other middleware of the original instance
+            web3.middleware_onion.inject(self._failover_middleware(url), 'failover', layer=0)
+            
+            if not web3.is_connected():
+                raise ConnectionError(f"Failed to connect to provider at {url}")
+            
+            self._web3s[url] = web3
+            return web3
+    
+    def _failover_middleware(self, url):
+        """
+        Create a middleware that retries failed requests on other providers.
+        
+        Args:
+            url (str): The URL of the provider the middleware is attached to.
+        
+        Returns:
+            callable: The middleware.
+        """
+        pool = self
+        
+        def middleware(make_request, web3):
+            def failover(method, params):
+                try:
+                    response = make_request(method, params)
+                    pool.mark_succeeded(url)
+                    return response
+                except PROVIDER_ERRORS as e:
+                    pool.mark_failed(url)
+                    error = e
+                
+                tried = {url}
+                while True:
+                    fallback_url = pool.pick_healthy(exclude=tried)
+                    if fallback_url is None:
+                        raise error
+                    tried.add(fallback_url)
+                    
+                    try:
+                        response = pool._get_web3(fallback_url).provider.make_request(method, params)
+                        pool.mark_succeeded(fallback_url)
+                        return response
+                    except PROVIDER_ERRORS + (ConnectionError,) as e:
+                        pool.mark_failed(fallback_url)
+                        error = e
+            
+            return failover
+        
+        return middleware
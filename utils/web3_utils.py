@@ -1,24 +1,209 @@
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
-from config.config import PROVIDER_URL, PRIVATE_KEY, WALLET_ADDRESS
+import threading
+from functools import lru_cache
+import orjson
+import requests
+from hexbytes import HexBytes
+from requests.adapters import HTTPAdapter
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from web3.middleware import geth_poa_middleware, async_geth_poa_middleware, construct_simple_cache_middleware
+from utils.web3_pool import Web3Pool
+from utils.retry import retryable
+from utils.rpc_codec import OrjsonHTTPProvider
+from config.config import PROVIDER_URLS, RPC_HTTP2, PRIVATE_KEY, WALLET_ADDRESS
 
-def get_web3_connection():
+# Timeout in seconds for JSON-RPC requests
+RPC_TIMEOUT = 10
+
+# Maximum number of connections kept open to the provider, enough for
+# every thread in the concurrent read and send paths
+HTTP_POOL_SIZE = 32
+
+def _create_http_session():
     """
-    Establish a connection to the Ethereum network.
+    Create an HTTP session that keeps connections to the provider alive.
+    
+    The session does not retry failed requests itself. Rate limit and
+    gateway errors raise HTTPError, which utils.retry.retryable retries with
+    backoff, so there is a single retry layer.
+    
+    Returns:
+        requests.Session: The session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    return session
+
+# Shared by every provider and thread, so TCP and TLS connections are reused across calls
+_http_session = _create_http_session()
+
+@lru_cache(maxsize=1024)
+def checksum(address):
+    """
+    Convert an address to its checksummed form.
     
+    Checksumming hashes the address with Keccak-256, so results are cached.
+    
+    Args:
+        address (str): The address.
+        
+    Returns:
+        str: The checksummed address.
+    """
+    return Web3.to_checksum_address(address)
+
+def _create_web3(provider_url):
+    """
+    Create a Web3 instance for a provider.
+    
+    Requests use the shared HTTP session, or the shared HTTP/2 client when
+    RPC_HTTP2 is enabled.
+    
+    Args:
+        provider_url (str): The RPC endpoint URL.
+        
     Returns:
-        Web3: A Web3 instance connected to the provider.
+        Web3: The Web3 instance.
     """
-    web3 = Web3(Web3.HTTPProvider(PROVIDER_URL))
+    if RPC_HTTP2:
+        # Imported here so httpx is only needed when HTTP/2 is enabled
+        from utils.httpx_provider import HTTPXProvider
+        provider = HTTPXProvider(provider_url, timeout=RPC_TIMEOUT)
+    else:
+        provider = OrjsonHTTPProvider(
+            provider_url,
+            request_kwargs={'timeout': RPC_TIMEOUT},
+            session=_http_session
+        )
+    
+    web3 = Web3(provider)
     
     # Add PoA middleware for networks like Polygon
     web3.middleware_onion.inject(geth_poa_middleware, layer=0)
     
-    if not web3.is_connected():
-        raise ConnectionError(f"Failed to connect to provider at {PROVIDER_URL}")
+    # The validation middleware asks for the chain ID before every eth_call.
+    # It never changes, so it is fetched once per thread and then cached,
+    # keeping a multicall snapshot to a single round-trip.
+    web3.middleware_onion.add(
+        construct_simple_cache_middleware(rpc_whitelist={'eth_chainId'}),
+        'chain_id_cache'
+    )
     
     return web3
 
+# One Web3 per provider URL, each created and checked on first use, then
+# shared by the whole process
+_web3_pool = Web3Pool(PROVIDER_URLS, _create_web3)
+
+@retryable(retry_on=(ConnectionError,))
+def get_web3_connection():
+    """
+    Establish a connection to the Ethereum network.
+    
+    Connections are taken round-robin from the configured providers,
+    skipping providers that recently failed. Each provider's connection is
+    created and checked once, and the same instance is returned on every
+    later call. If no provider can be reached, connecting is retried with
+    exponential backoff.
+    
+    Returns:
+        Web3: A Web3 instance connected to a provider.
+        
+    Raises:
+        ConnectionError: If no provider can be connected to.
+    """
+    return _web3_pool.get()
+
+# Created on first use, then shared by the whole process
+_async_web3_singleton = None
+
+def get_async_web3_connection():
+    """
+    Get an asynchronous connection to the Ethereum network.
+    
+    Unlike get_web3_connection, this uses only the first configured provider
+    and does not check the connection, since that requires awaiting an RPC
+    call. The same instance is returned on every call.
+    
+    Returns:
+        AsyncWeb3: An AsyncWeb3 instance using the provider.
+    """
+    global _async_web3_singleton
+    
+    if _async_web3_singleton is None:
+        web3 = AsyncWeb3(AsyncHTTPProvider(PROVIDER_URLS[0]))
+        
+        # Add PoA middleware for networks like Polygon
+        web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        
+        # Only prebuilt read-only calls, raw transactions and receipt lookups
+        # go through this instance, so the validation middleware's eth_chainId
+        # request before every eth_call is not needed
+        web3.middleware_onion.remove('validation')
+        
+        _async_web3_singleton = web3
+    
+    return _async_web3_singleton
+
+# Deriving the account from the private key is pure CPU work, so it is done once
+_account = None
+
+@retryable()
+def batch_eth_call(calls, block_identifier='latest'):
+    """
+    Send several eth_call requests to the provider in one JSON-RPC batch.
+    
+    The batch is posted as a single JSON array over the shared session, so
+    all calls cost one HTTP round-trip. It is retried on transient provider
+    errors. Providers that reject batches make this raise, and callers
+    should then fall back to individual calls.
+    
+    Args:
+        calls (list): (target address, calldata) tuples.
+        block_identifier (str, optional): The block to call against. Defaults to 'latest'.
+        
+    Returns:
+        list: (success, return_data) tuples, in the same order as calls.
+        
+    Raises:
+        ValueError: If the provider does not return a batch response.
+    """
+    payload = [
+        {
+            'jsonrpc': '2.0',
+            'id': request_id,
+            'method': 'eth_call',
+            'params': [{'to': address, 'data': calldata}, block_identifier]
+        }
+        for request_id, (address, calldata) in enumerate(calls)
+    ]
+    
+    provider_url = get_web3_connection().provider.endpoint_uri
+    response = _http_session.post(
+        provider_url,
+        data=orjson.dumps(payload),
+        headers={'Content-Type': 'application/json'},
+        timeout=RPC_TIMEOUT
+    )
+    response.raise_for_status()
+    responses = orjson.loads(response.content)
+    
+    if not isinstance(responses, list):
+        raise ValueError(f"Provider does not support batch requests: {responses}")
+    
+    # Responses may come back in any order
+    results = [(False, b'')] * len(calls)
+    for item in responses:
+        if 'result' in item:
+            results[item['id']] = (True, HexBytes(item['result']))
+    
+    return results
+
 def get_account():
     """
     Get the account object from the private key.
@@ -26,34 +211,108 @@ def get_account():
     Returns:
         Account: The account object.
     """
-    web3 = get_web3_connection()
-    account = web3.eth.account.from_key(PRIVATE_KEY)
-    return account
+    global _account
+    
+    if _account is None:
+        web3 = get_web3_connection()
+        _account = web3.eth.account.from_key(PRIVATE_KEY)
+    
+    return _account
+
+# Node errors for a raw transaction that was already sent, seen when a
+# retried send follows an attempt whose response was lost
+ALREADY_SENT_ERRORS = ('already known', 'known transaction', 'already imported', 'nonce too low')
+
+# Next nonce to use, seeded from the node on first use and then tracked locally
+_next_nonce = None
+_nonce_lock = threading.Lock()
 
 def get_nonce():
     """
-    Get the current nonce for the wallet address.
+    Reserve the next nonce for the wallet address.
+    
+    The nonce is fetched from the node once, including pending transactions,
+    and then incremented locally for every transaction.
     
     Returns:
-        int: The current nonce.
+        int: The nonce to use.
     """
-    web3 = get_web3_connection()
-    return web3.eth.get_transaction_count(WALLET_ADDRESS)
+    global _next_nonce
+    
+    with _nonce_lock:
+        if _next_nonce is None:
+            web3 = get_web3_connection()
+            _next_nonce = web3.eth.get_transaction_count(WALLET_ADDRESS, 'pending')
+        
+        nonce = _next_nonce
+        _next_nonce += 1
+        return nonce
+
+def reset_nonce():
+    """
+    Discard the local nonce, so that the next get_nonce call fetches it from the node.
+    
+    Call this when a reserved nonce may not have been used, e.g. after a
+    failed build or send.
+    """
+    global _next_nonce
+    
+    with _nonce_lock:
+        _next_nonce = None
 
 def sign_and_send_transaction(transaction):
     """
     Sign and send a transaction.
     
+    With several providers configured, the transaction is broadcast to all
+    of them concurrently and the first acknowledgement is returned. Sending
+    is retried on transient provider errors. If an earlier attempt reached
+    the node and only its response was lost, the retry is rejected as
+    already known or with a too low nonce; the transaction was sent, so its
+    hash is returned instead of reporting a failure.
+    
+    Args:
+        transaction (dict): The transaction to sign and send.
+        
+    Returns:
+        str: The transaction hash.
+    """
+    account = get_account()
+    signed_tx = account.sign_transaction(transaction)
+    attempts = 0
+    
+    @retryable()
+    def send():
+        nonlocal attempts
+        attempts += 1
+        
+        try:
+            if len(PROVIDER_URLS) > 1:
+                return _web3_pool.broadcast_raw_transaction(signed_tx.rawTransaction)
+            return get_web3_connection().eth.send_raw_transaction(signed_tx.rawTransaction)
+        except ValueError as e:
+            if attempts > 1 and any(message in str(e).lower() for message in ALREADY_SENT_ERRORS):
+                return signed_tx.hash
+            raise
+    
+    return Web3.to_hex(send())
+
+async def sign_and_send_transaction_async(transaction):
+    """
+    Sign and send a transaction without blocking the event loop.
+    
+    Signing is done locally with the cached account; only the broadcast is awaited.
+    
     Args:
         transaction (dict): The transaction to sign and send.
         
     Returns:
         str: The transaction hash.
     """
-    web3 = get_web3_connection()
+    web3 = get_async_web3_connection()
     account = get_account()
     
     signed_tx = account.sign_transaction(transaction)
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+    tx_hash = await web3.eth.send_raw_transaction(signed_tx.rawTransaction)
     
-    return web3.to_hex(tx_hash)
+    return Web3.to_hex(tx_hash)